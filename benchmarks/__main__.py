@@ -0,0 +1,6 @@
+"""
+python -m benchmarks: run or compare pipeline benchmarks
+"""
+from benchmarks.pipeline import cli
+
+cli()
@@ -0,0 +1,231 @@
+"""
+Time and memory-profile each stage of the pipeline on books of several sizes
+
+Each size is a Simulator config (funds x shareclasses x customers x years).
+For every size, a book is simulated into a temporary directory, loaded,
+calculated and written, and each stage is measured separately:
+
+  simulate        Simulator.simulate
+  load            AccountingSystem.from_simulated_data
+  calc_accounts   AccountingSystem.calc_accounts
+  calc_impact     AccountingSystem.calc_impact
+  write_csv       write_account_values + write_impact, csv
+  write_parquet   write_account_values + write_impact, parquet
+
+Wall time is the best of `repeat` untraced runs; peak memory is the peak of
+Python and numpy allocations under tracemalloc in one further run, as tracing
+slows the stage down. Results are appended, with the git commit, to a JSON
+lines file so runs on different commits can be compared.
+"""
+import datetime
+import json
+import logging
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+import uuid
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import click
+
+from src.accounting_system import AccountingSystem
+from src.simulator import Simulator
+from src.storage import write_account_values, write_impact
+
+logger = logging.getLogger(__name__)
+
+RESULTS_PATH = Path(__file__).parent / "results.jsonl"
+
+SIZES = {
+    "small": dict(num_funds=2, num_shareclasses=2, num_customers=50, years=1),
+    "medium": dict(num_funds=5, num_shareclasses=3, num_customers=1000, years=2),
+    "large": dict(num_funds=10, num_shareclasses=3, num_customers=10000, years=5),
+}
+
+
+def make_simulator(
+    num_funds: int, num_shareclasses: int, num_customers: int, years: int
+) -> Simulator:
+    """seeded Simulator config for a benchmark size"""
+    start_date = datetime.date(2020, 1, 1)
+    return Simulator(
+        start_date=start_date,
+        end_date=start_date.replace(year=start_date.year + years)
+        - datetime.timedelta(days=1),
+        num_funds=num_funds,
+        num_shareclasses=num_shareclasses,
+        num_customers=num_customers,
+        seed=0,
+    )
+
+
+def measure(stage: Callable[[], object], repeat: int = 1, memory: bool = True):
+    """
+    Run a stage, timing it and optionally tracing its peak memory
+
+    :return: the stage's result, best wall time in seconds, and peak traced
+    memory in bytes (None without memory)
+    """
+    seconds = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = stage()
+        seconds = min(seconds, time.perf_counter() - start)
+    peak = None
+    if memory:
+        tracemalloc.start()
+        try:
+            result = stage()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return result, seconds, peak
+
+
+def run_size(name: str, repeat: int = 1, memory: bool = True) -> List[Dict]:
+    """measure every stage of the pipeline on one book size"""
+    params = SIZES[name]
+    sim = make_simulator(**params)
+    records = []
+
+    def record(stage: str, seconds: float, peak: int):
+        logger.info("%s %s: %.3fs, peak %s bytes", name, stage, seconds, peak)
+        records.append(
+            dict(size=name, **params, stage=stage, seconds=seconds, peak_bytes=peak)
+        )
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        data_path = Path(tmp_dir) / "book"
+        out_path = Path(tmp_dir) / "out"
+        out_path.mkdir()
+
+        _, seconds, peak = measure(
+            lambda: sim.simulate(data_path, return_params=[1.0, 0.005]), repeat, memory
+        )
+        record("simulate", seconds, peak)
+
+        system, seconds, peak = measure(
+            lambda: AccountingSystem.from_simulated_data(data_path), repeat, memory
+        )
+        record("load", seconds, peak)
+
+        account_values, seconds, peak = measure(system.calc_accounts, repeat, memory)
+        record("calc_accounts", seconds, peak)
+
+        impact, seconds, peak = measure(
+            lambda: system.calc_impact(account_values), repeat, memory
+        )
+        record("calc_impact", seconds, peak)
+
+        for output_format in ["csv", "parquet"]:
+
+            def write():
+                write_account_values(account_values, out_path, output_format)
+                write_impact(impact, out_path, output_format)
+
+            _, seconds, peak = measure(write, repeat, memory)
+            record(f"write_{output_format}", seconds, peak)
+    return records
+
+
+def git_commit() -> str:
+    """current commit of the working tree, or None outside git"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            check=True,
+            text=True,
+            cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def read_results(results_path: Path) -> List[Dict]:
+    """every record saved so far"""
+    if not Path(results_path).exists():
+        return []
+    with open(results_path) as results_file:
+        return [json.loads(line) for line in results_file if line.strip()]
+
+
+@click.group()
+def cli():
+    """pipeline benchmarks"""
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+
+@cli.command()
+@click.option(
+    "--size",
+    "sizes",
+    multiple=True,
+    default=["small", "medium"],
+    type=click.Choice(list(SIZES)),
+    help="Book sizes to benchmark (repeatable)",
+)
+@click.option("--repeat", default=1, type=int, help="Timed runs per stage")
+@click.option(
+    "--memory/--no-memory", default=True, help="Trace peak memory of each stage"
+)
+@click.option(
+    "--results_path",
+    default=str(RESULTS_PATH),
+    type=str,
+    help="JSON lines to append to",
+)
+def run(sizes: List[str], repeat: int, memory: bool, results_path: str):
+    """Benchmark each pipeline stage and append the results"""
+    run_info = dict(
+        run=uuid.uuid4().hex,
+        commit=git_commit(),
+        timestamp=datetime.datetime.now().isoformat(timespec="seconds"),
+        python=platform.python_version(),
+        machine=platform.node(),
+    )
+    with open(results_path, "a") as results_file:
+        for name in sizes:
+            for record in run_size(name, repeat=repeat, memory=memory):
+                results_file.write(json.dumps({**run_info, **record}) + "\n")
+
+
+@cli.command()
+@click.option(
+    "--results_path", default=str(RESULTS_PATH), type=str, help="JSON lines to read"
+)
+@click.option(
+    "--threshold",
+    default=0.2,
+    type=float,
+    help="Flag stages slower, or using more memory, by more than this fraction",
+)
+def compare(results_path: str, threshold: float):
+    """Compare the latest run of each size and stage with the one before it"""
+    latest, previous = {}, {}
+    for record in read_results(results_path):
+        key = (record["size"], record["stage"])
+        if key in latest and latest[key]["run"] != record["run"]:
+            previous[key] = latest[key]
+        latest[key] = record
+    for key, new in latest.items():
+        old = previous.get(key)
+        if old is None:
+            continue
+        time_ratio = new["seconds"] / old["seconds"]
+        line = (
+            f"{key[0]:>8} {key[1]:<14} {old['commit']} -> {new['commit']}: "
+            f"{old['seconds']:.3f}s -> {new['seconds']:.3f}s ({time_ratio - 1:+.0%})"
+        )
+        flagged = time_ratio > 1 + threshold
+        if old["peak_bytes"] and new["peak_bytes"]:
+            memory_ratio = new["peak_bytes"] / old["peak_bytes"]
+            line += (
+                f", peak {old['peak_bytes'] / 2**20:.1f}MB -> "
+                f"{new['peak_bytes'] / 2**20:.1f}MB ({memory_ratio - 1:+.0%})"
+            )
+            flagged = flagged or memory_ratio > 1 + threshold
+        click.echo(("REGRESSION " if flagged else "") + line)
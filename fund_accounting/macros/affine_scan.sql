@@ -0,0 +1,29 @@
+{#
+  CTEs composing the daily NAV maps of `steps` (account, day, a, b), where
+  NAV_day = a * NAV_day-1 + b, into prefix maps from day 1, ending in a
+  scan_final CTE. Each round joins every day with the running map 2^k days
+  earlier (a Hillis-Steele scan), so n_days take ceil(log2(n_days)) set-based
+  joins rather than one recursive step per day. n_days may over-estimate.
+#}
+{% macro affine_scan(steps, n_days) -%}
+scan_0 AS (
+  SELECT account, day, a, b FROM {{ steps }}
+),
+{%- set ns = namespace(rounds=0) %}
+{%- for k in range(64) if 2 ** k < n_days %}
+scan_{{ k + 1 }} AS (
+  SELECT
+    cur.account,
+    cur.day,
+    CASE WHEN prev.day IS NULL THEN cur.a ELSE cur.a * prev.a END AS a,
+    CASE WHEN prev.day IS NULL THEN cur.b ELSE cur.a * prev.b + cur.b END AS b
+  FROM scan_{{ k }} cur
+  LEFT JOIN scan_{{ k }} prev
+    ON prev.account = cur.account AND prev.day = cur.day - {{ 2 ** k }}
+),
+{%- set ns.rounds = k + 1 %}
+{%- endfor %}
+scan_final AS (
+  SELECT * FROM scan_{{ ns.rounds }}
+)
+{%- endmacro %}
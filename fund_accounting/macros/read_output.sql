@@ -0,0 +1,14 @@
+{#
+  read one output of `main.py calculate-impact` from var('python_output'),
+  written with --format var('python_format'): account_values or impact
+#}
+{% macro read_output(name) -%}
+  {%- set path = var('python_output') ~ '/' ~ name -%}
+  {%- if var('python_format') == 'csv' -%}
+    read_csv_auto('{{ path }}.csv', header=True)
+  {%- elif name == 'account_values' -%}
+    read_parquet('{{ path }}/*/*.parquet', hive_partitioning=True)
+  {%- else -%}
+    read_parquet('{{ path }}.parquet')
+  {%- endif -%}
+{%- endmacro %}
@@ -0,0 +1,11 @@
+{#
+  read_parquet() over one simulated table in var('data_path'), either a single
+  <name>.parquet file or, for sharded simulations, <name>/part-*.parquet
+#}
+{% macro read_table(name) -%}
+  {%- if var('partitioned') and name in ['customers', 'accounts', 'cashflows'] -%}
+    read_parquet('{{ var("data_path") }}/{{ name }}/part-*.parquet')
+  {%- else -%}
+    read_parquet('{{ var("data_path") }}/{{ name }}.parquet')
+  {%- endif -%}
+{%- endmacro %}
@@ -0,0 +1,47 @@
+{{
+  config(
+    materialized='incremental',
+    unique_key='account'
+  )
+}}
+
+{#
+  per-account cashflow summary; incremental runs aggregate only cashflows
+  after each account's last_cashflow and fold them into the stored totals
+#}
+WITH
+{% if is_incremental() %}
+loaded AS (
+  SELECT * FROM {{ this }}
+),
+{% endif %}
+new_cashflows AS (
+  SELECT
+    c.account,
+    count(*) AS n_cashflows,
+    sum(c.amount) AS net_cashflow,
+    sum(abs(c.amount)) AS gross_cashflow,
+    min(c.date) AS first_cashflow,
+    max(c.date) AS last_cashflow
+  FROM {{ ref('stg_cashflows') }} c
+  {% if is_incremental() %}
+  LEFT JOIN loaded l ON l.account = c.account
+  WHERE l.last_cashflow IS NULL OR c.date > l.last_cashflow
+  {% endif %}
+  GROUP BY c.account
+)
+SELECT
+  account,
+  sum(n_cashflows)::BIGINT AS n_cashflows,
+  sum(net_cashflow) AS net_cashflow,
+  sum(gross_cashflow) AS gross_cashflow,
+  min(first_cashflow) AS first_cashflow,
+  max(last_cashflow) AS last_cashflow
+FROM (
+  SELECT * FROM new_cashflows
+  {% if is_incremental() %}
+  UNION ALL
+  SELECT l.* FROM loaded l INNER JOIN new_cashflows n USING (account)
+  {% endif %}
+) c
+GROUP BY account
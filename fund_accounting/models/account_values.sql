@@ -0,0 +1,109 @@
+{{
+  config(
+    materialized='incremental'
+  )
+}}
+
+{#
+  Daily values of every account, as in AccountingSystem.calc_accounts:
+
+    init_GAV = previous NAV * gross_return
+    GAV = init_GAV + cashflow
+    expense = GAV * expense_ratio
+    NAV = GAV - expense
+
+  Incremental runs continue each account from its last stored NAV, so only
+  dates after it are calculated; new accounts start from initial_investment.
+#}
+
+{%- if execute %}
+  {%- set n_days = run_query(
+    "SELECT count(*) FROM (SELECT date FROM " ~ ref('stg_fund_returns')
+    ~ " UNION SELECT date FROM " ~ ref('stg_cashflows') ~ ")"
+  ).columns[0].values()[0] %}
+{%- else %}
+  {%- set n_days = 1 %}
+{%- endif %}
+
+WITH dates AS (
+  SELECT date FROM {{ ref('stg_fund_returns') }}
+  UNION
+  SELECT date FROM {{ ref('stg_cashflows') }}
+),
+{% if is_incremental() %}
+loaded AS (
+  SELECT account, arg_max(NAV, date) AS nav, max(date) AS date
+  FROM {{ this }}
+  GROUP BY account
+),
+{% endif %}
+accounts AS (
+  SELECT
+    cs.account,
+    cs.customer,
+    cs.fund,
+    cs.shareclass,
+    cs.expense_ratio,
+    {% if is_incremental() -%}
+    coalesce(l.nav, cs.initial_investment)::DOUBLE AS start_nav,
+    l.date AS start_date
+    {%- else -%}
+    cs.initial_investment::DOUBLE AS start_nav,
+    NULL::DATE AS start_date
+    {%- endif %}
+  FROM {{ ref('customer_shareclasses') }} cs
+  {% if is_incremental() %}
+  LEFT JOIN loaded l ON l.account = cs.account
+  {% endif %}
+),
+inputs AS (
+  SELECT
+    a.account,
+    d.date,
+    row_number() OVER (PARTITION BY a.fund, a.account ORDER BY d.date) AS day,
+    r.returns AS gross_return,
+    coalesce(c.amount, 0.0) AS cashflow
+  FROM accounts a
+  INNER JOIN dates d ON a.start_date IS NULL OR d.date > a.start_date
+  LEFT JOIN {{ ref('stg_fund_returns') }} r ON r.fund = a.fund AND r.date = d.date
+  LEFT JOIN {{ ref('stg_cashflows') }} c ON c.account = a.account AND c.date = d.date
+),
+steps AS (
+  SELECT
+    i.account,
+    i.day,
+    i.gross_return * (1 - a.expense_ratio) AS a,
+    i.cashflow * (1 - a.expense_ratio) AS b
+  FROM inputs i
+  INNER JOIN accounts a ON a.account = i.account
+),
+{{ affine_scan('steps', n_days) }},
+gav AS (
+  SELECT
+    i.date,
+    i.gross_return,
+    i.cashflow,
+    coalesce(
+      lag(s.a * a.start_nav + s.b) OVER (PARTITION BY a.fund, a.account ORDER BY i.day),
+      a.start_nav
+    ) * i.gross_return AS init_GAV,
+    a.account,
+    a.expense_ratio
+  FROM inputs i
+  INNER JOIN scan_final s ON s.account = i.account AND s.day = i.day
+  INNER JOIN accounts a ON a.account = i.account
+)
+SELECT
+  g.date,
+  g.gross_return,
+  g.cashflow,
+  g.init_GAV,
+  g.init_GAV + g.cashflow AS GAV,
+  (g.init_GAV + g.cashflow) * g.expense_ratio AS expense,
+  (g.init_GAV + g.cashflow) - (g.init_GAV + g.cashflow) * g.expense_ratio AS NAV,
+  a.account,
+  a.customer,
+  a.fund,
+  a.shareclass
+FROM gav g
+INNER JOIN accounts a ON a.account = g.account
@@ -1,9 +1,13 @@
 {{
   config(
-    materialized='table'
+    materialized='incremental',
+    unique_key='account'
   )
 }}
 
-SELECT c.name, i.shareclass_name, c.turnover
-FROM  read_parquet('../data/20220623.1553/customers.parquet') c 
-INNER JOIN read_parquet('../data/20220623.1553/investment.parquet') i ON c.name = i.customer_name
+SELECT a.account, a.customer, a.fund, a.shareclass, a.initial_investment, c.turnover
+FROM {{ ref('stg_accounts') }} a
+INNER JOIN {{ ref('stg_customers') }} c ON c.name = a.customer
+{% if is_incremental() %}
+WHERE a.account NOT IN (SELECT account FROM {{ this }})
+{% endif %}
@@ -1,9 +1,49 @@
-SELECT 
-  cs.name AS customer,
-  f.name AS fund,
-  cs.shareclass_name AS shareclass,
-  max(fr.returns) AS maxreturn
-FROM {{ref('customer_shareclasses')}} cs 
-INNER JOIN read_parquet('../data/20220623.1553/funds.parquet') f ON cs.fund_name = f.name
-INNER JOIN read_parquet('../data/20220623.1553/fund_returns.parquet') fr ON f.name = fr.fund
-GROUP BY cs.name, f.name, shareclass
+{{
+  config(
+    materialized='incremental',
+    unique_key='account'
+  )
+}}
+
+{#
+  max return per fund over the dates loaded since each fund's through_date,
+  combined with the max already recorded
+#}
+WITH
+{% if is_incremental() %}
+loaded AS (
+  SELECT fund, max(maxreturn) AS maxreturn, max(through_date) AS through_date
+  FROM {{ this }}
+  GROUP BY fund
+),
+{% endif %}
+new_returns AS (
+  SELECT r.fund, max(r.returns) AS maxreturn, max(r.date) AS through_date
+  FROM {{ ref('stg_fund_returns') }} r
+  {% if is_incremental() %}
+  LEFT JOIN loaded l ON l.fund = r.fund
+  WHERE l.through_date IS NULL OR r.date > l.through_date
+  {% endif %}
+  GROUP BY r.fund
+),
+fund_returns AS (
+  SELECT fund, max(maxreturn) AS maxreturn, max(through_date) AS through_date
+  FROM (
+    SELECT * FROM new_returns
+    {% if is_incremental() %}
+    UNION ALL
+    SELECT * FROM loaded
+    {% endif %}
+  ) r
+  GROUP BY fund
+)
+SELECT
+  cs.account,
+  cs.customer,
+  cs.fund,
+  cs.shareclass,
+  fr.maxreturn,
+  fr.through_date
+FROM {{ ref('customer_shareclasses') }} cs
+INNER JOIN {{ ref('stg_funds') }} f ON cs.fund = f.name
+INNER JOIN fund_returns fr ON fr.fund = f.name
@@ -1,3 +1,14 @@
-SELECT *
-FROM {{ref('customer_investment')}} ci 
-INNER JOIN read_parquet('../data/20220623.1553/shareclasses.parquet') s ON ci.shareclass_name = s.name
+{{
+  config(
+    materialized='incremental',
+    unique_key='account'
+  )
+}}
+
+SELECT ci.*, s.expense_ratio
+FROM {{ ref('customer_investment') }} ci
+INNER JOIN {{ ref('stg_shareclasses') }} s
+  ON s.fund = ci.fund AND s.shareclass = ci.shareclass
+{% if is_incremental() %}
+WHERE ci.account NOT IN (SELECT account FROM {{ this }})
+{% endif %}
@@ -0,0 +1,19 @@
+{#
+  Difference in total expenses between consecutive shareclasses of each
+  customer and fund, as in AccountingSystem.calc_impact; the first
+  shareclass of each (customer, fund) has no impact (NULL)
+#}
+WITH total_expenses AS (
+  SELECT customer, fund, shareclass, sum(expense) AS total_expense
+  FROM {{ ref('account_values') }}
+  GROUP BY customer, fund, shareclass
+)
+SELECT
+  customer,
+  fund,
+  shareclass,
+  total_expense,
+  total_expense - lag(total_expense) OVER (
+    PARTITION BY fund, customer ORDER BY shareclass
+  ) AS expense
+FROM total_expenses
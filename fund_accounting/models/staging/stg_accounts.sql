@@ -0,0 +1,19 @@
+{{
+  config(
+    materialized='incremental',
+    unique_key='account'
+  )
+}}
+
+SELECT
+  customer || '-' || fund || '_' || shareclass AS account,
+  customer,
+  fund,
+  shareclass,
+  initial_investment
+FROM {{ read_table('accounts') }}
+{% if is_incremental() %}
+WHERE customer || '-' || fund || '_' || shareclass NOT IN (
+  SELECT account FROM {{ this }}
+)
+{% endif %}
@@ -0,0 +1,17 @@
+{{
+  config(
+    materialized='incremental'
+  )
+}}
+
+{#
+  append cashflows dated after the last load, plus the full history of
+  accounts not seen before (e.g. a new shard of customers)
+#}
+SELECT account::VARCHAR AS account, date, sum(amount) AS amount
+FROM {{ read_table('cashflows') }}
+{% if is_incremental() %}
+WHERE date > (SELECT max(date) FROM {{ this }})
+  OR account::VARCHAR NOT IN (SELECT DISTINCT account FROM {{ this }})
+{% endif %}
+GROUP BY account, date
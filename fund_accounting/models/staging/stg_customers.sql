@@ -0,0 +1,12 @@
+{{
+  config(
+    materialized='incremental',
+    unique_key='name'
+  )
+}}
+
+SELECT name, turnover
+FROM {{ read_table('customers') }}
+{% if is_incremental() %}
+WHERE name NOT IN (SELECT name FROM {{ this }})
+{% endif %}
@@ -0,0 +1,37 @@
+{{
+  config(
+    materialized='incremental'
+  )
+}}
+
+{#
+  append only the dates after the last one loaded for each fund. The earliest
+  of those high-water marks (funds not loaded yet count from 1900) is looked
+  up once and filtered on as a constant, which DuckDB pushes into the parquet
+  scan to skip row groups already loaded; the join to each fund's own mark
+  then drops the rows a fund already has
+#}
+{%- set since = '1900-01-01' %}
+{%- if execute and is_incremental() %}
+  {%- set since = run_query(
+    "SELECT coalesce(min(coalesce(l.last, TIMESTAMP '1900-01-01')), "
+    ~ "TIMESTAMP '1900-01-01') FROM " ~ ref('stg_funds') ~ " f LEFT JOIN "
+    ~ "(SELECT fund, max(date) AS last FROM " ~ this ~ " GROUP BY fund) l "
+    ~ "ON l.fund = f.name"
+  ).columns[0].values()[0] %}
+{%- endif %}
+
+{% if is_incremental() %}
+WITH loaded AS (
+  SELECT fund, max(date) AS last
+  FROM {{ this }}
+  GROUP BY fund
+)
+{% endif %}
+SELECT r.fund, r.date, r.returns
+FROM {{ read_table('fund_returns') }} r
+{% if is_incremental() %}
+LEFT JOIN loaded l ON l.fund = r.fund
+WHERE r.date > TIMESTAMP '{{ since }}'
+  AND r.date > coalesce(l.last, TIMESTAMP '1900-01-01')
+{% endif %}
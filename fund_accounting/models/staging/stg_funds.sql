@@ -0,0 +1,2 @@
+SELECT name
+FROM {{ read_table('funds') }}
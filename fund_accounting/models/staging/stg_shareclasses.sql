@@ -0,0 +1,2 @@
+SELECT fund, name AS shareclass, expense_ratio
+FROM {{ read_table('shareclasses') }}
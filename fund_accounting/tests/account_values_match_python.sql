@@ -0,0 +1,24 @@
+{{ config(enabled=var('python_output') != '') }}
+
+{#
+  account_values rows missing from, or differing from, the account values
+  written by `main.py calculate-impact --out_path <python_output>`
+#}
+WITH python AS (
+  SELECT account, date::DATE AS date, NAV, expense
+  FROM {{ read_output('account_values') }}
+)
+SELECT
+  coalesce(p.account, d.account) AS account,
+  coalesce(p.date, d.date) AS date,
+  p.NAV AS python_nav,
+  d.NAV AS dbt_nav,
+  p.expense AS python_expense,
+  d.expense AS dbt_expense
+FROM python p
+FULL OUTER JOIN {{ ref('account_values') }} d
+  ON d.account = p.account AND d.date = p.date
+WHERE p.account IS NULL
+  OR d.account IS NULL
+  OR abs(p.NAV - d.NAV) > 1e-9 * greatest(1, abs(p.NAV))
+  OR abs(p.expense - d.expense) > 1e-9 * greatest(1, abs(p.expense))
@@ -0,0 +1,23 @@
+{{ config(enabled=var('python_output') != '') }}
+
+{#
+  shareclass_impact rows missing from, or differing from, the impact
+  written by `main.py calculate-impact --out_path <python_output>`
+#}
+WITH python AS (
+  SELECT customer, fund, shareclass, expense
+  FROM {{ read_output('impact') }}
+)
+SELECT
+  coalesce(p.customer, d.customer) AS customer,
+  coalesce(p.fund, d.fund) AS fund,
+  coalesce(p.shareclass, d.shareclass) AS shareclass,
+  p.expense AS python_expense,
+  d.expense AS dbt_expense
+FROM python p
+FULL OUTER JOIN {{ ref('shareclass_impact') }} d
+  ON d.customer = p.customer AND d.fund = p.fund AND d.shareclass = p.shareclass
+WHERE p.customer IS NULL
+  OR d.customer IS NULL
+  OR (p.expense IS NULL) <> (d.expense IS NULL)
+  OR abs(p.expense - d.expense) > 1e-9 * greatest(1, abs(p.expense))
@@ -4,10 +4,14 @@ CLI for fund accounting simulator + dbt
 import datetime
 import logging
 from pathlib import Path
+from typing import Tuple
 
 import click
 
-from src import AccountingSystem, Simulator
+# pandas, numpy and the domain modules are imported inside the commands that
+# need them, keeping --help and argument errors fast for schedulers
+from src.constants import OUTPUT_FORMATS
+from src.metrics import Profiler
 
 logging.basicConfig(format="[%(asctime)s] %(levelname)s - %(message)s")
 logger = logging.getLogger()
@@ -16,12 +20,44 @@ logger.addHandler(logging.StreamHandler())
 
 @click.group()
 @click.option("--debug/--no-debug", default=False)
-def cli(debug):
+@click.option(
+    "--profile",
+    default=None,
+    type=str,
+    help="Write per-stage wall time, rows, accounts/sec and peak RSS to this "
+    "JSON file",
+)
+@click.option(
+    "--cprofile/--no-cprofile",
+    default=False,
+    help="Also run under cProfile, saving stats next to the --profile report "
+    "with a .prof suffix",
+)
+@click.pass_context
+def cli(ctx, debug, profile, cprofile):
     """base CLI group"""
     if debug:
         logger.setLevel(logging.DEBUG)
     else:
         logger.setLevel(logging.INFO)
+    if cprofile and profile is None:
+        raise click.UsageError("--cprofile needs a --profile report path")
+    ctx.obj = Profiler(enabled=profile is not None)
+    if profile is not None:
+        ctx.call_on_close(lambda: ctx.obj.write(profile))
+    if cprofile:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+        def dump_stats():
+            profiler.disable()
+            stats_path = Path(profile).with_suffix(".prof")
+            profiler.dump_stats(stats_path)
+            logger.info("Wrote cProfile stats to %s", stats_path)
+
+        ctx.call_on_close(dump_stats)
 
 
 @cli.command()
@@ -38,12 +74,30 @@ def cli(debug):
     help="mean daily return",
 )
 @click.option("--return_scale", default=0.005, type=float, help="sigma of daily return")
-def generate_data(config_path: str, return_mean: float, return_scale: float):
+@click.option(
+    "--workers",
+    default=1,
+    type=int,
+    help="Number of processes across which to generate customer shards",
+)
+@click.pass_obj
+def generate_data(
+    profiler: Profiler,
+    config_path: str,
+    return_mean: float,
+    return_scale: float,
+    workers: int,
+):
     """Simulate fund accounting data for use in dbt"""
+    from src import Simulator
+
     sim = Simulator.from_json(config_path)
 
     out_path = Path(f"data/{datetime.datetime.now():%Y%m%d.%H%M}")
-    sim.simulate(out_path, return_params=[return_mean, return_scale])
+    with profiler.stage("simulate"):
+        sim.simulate(
+            out_path, workers=workers, return_params=[return_mean, return_scale]
+        )
 
 
 @cli.command()
@@ -59,19 +113,279 @@ def generate_data(config_path: str, return_mean: float, return_scale: float):
     type=str,
     help="Path to which to output results",
 )
-def calculate_impact(data_path: str, out_path: str):
+@click.option(
+    "--workers",
+    default=1,
+    type=int,
+    help="Number of processes across which to split accounts by fund",
+)
+@click.option(
+    "--chunk_size",
+    default=None,
+    type=int,
+    help="Stream accounts in chunks of this size, writing account values to a "
+    "parquet dataset partitioned by fund instead of one CSV",
+)
+@click.option(
+    "--incremental/--no-incremental",
+    default=False,
+    help="Only read and calculate dates after the checkpoint left in out_path "
+    "by the previous incremental run, appending to the account values",
+)
+@click.option(
+    "--engine",
+    default="pandas",
+    type=click.Choice(["pandas", "duckdb"]),
+    help="Calculate in pandas/numpy, or in DuckDB SQL over the parquet files",
+)
+@click.option(
+    "--format",
+    "output_format",
+    default=None,
+    type=click.Choice(OUTPUT_FORMATS),
+    help="Output file format. parquet and arrow write account values as a "
+    "zstd-compressed dataset partitioned by fund. Defaults to csv, or parquet "
+    "with --chunk_size",
+)
+@click.option(
+    "--cache/--no-cache",
+    default=True,
+    help="Reuse the values of accounts whose inputs are unchanged since a "
+    "previous run (pandas engine only)",
+)
+@click.option(
+    "--cache_dir",
+    default=None,
+    type=str,
+    help="Directory of the calc cache, which should be kept apart from books "
+    "and outputs; defaults to ~/.cache/fund_accounting/calc",
+)
+@click.option(
+    "--customer",
+    "customers",
+    multiple=True,
+    help="Only calculate accounts of this customer (repeatable)",
+)
+@click.option(
+    "--fund", "funds", multiple=True, help="Only calculate accounts in this fund"
+)
+@click.option(
+    "--shareclass",
+    "shareclasses",
+    multiple=True,
+    help="Only calculate accounts in shareclasses of this name",
+)
+@click.option(
+    "--start_date",
+    default=None,
+    type=click.DateTime(["%Y-%m-%d"]),
+    help="Only output account values, and impact, from this date",
+)
+@click.option(
+    "--end_date",
+    default=None,
+    type=click.DateTime(["%Y-%m-%d"]),
+    help="Only read and calculate dates up to this one",
+)
+@click.pass_obj
+def calculate_impact(
+    profiler: Profiler,
+    data_path: str,
+    out_path: str,
+    workers: int,
+    chunk_size: int,
+    incremental: bool,
+    engine: str,
+    output_format: str,
+    cache: bool,
+    cache_dir: str,
+    customers: Tuple[str],
+    funds: Tuple[str],
+    shareclasses: Tuple[str],
+    start_date: datetime.datetime,
+    end_date: datetime.datetime,
+):
     """Calculate difference between share class expenses using specified data"""
-    account_system = AccountingSystem.from_simulated_data(data_path)
-    account_values = account_system.calc_accounts()
-    impact = account_system.calc_impact(account_values)
+    from src import AccountingSystem
+    from src.accounting_system import NoMatchingAccountsError
+    from src.calc_cache import CalcCache, default_cache_dir
+    from src.storage import (
+        read_checkpoint,
+        write_account_values,
+        write_checkpoint,
+        write_impact,
+    )
 
     if out_path is None:
         out_path = data_path
-    logger.info("Outputting impact and account values to %s", out_path)
     out_path = Path(out_path)
+    if output_format is None:
+        output_format = "csv" if chunk_size is None else "parquet"
+    calc_cache = None
+    if cache:
+        calc_cache = CalcCache(default_cache_dir() if cache_dir is None else cache_dir)
+    book_filters = dict(
+        customers=list(customers) or None,
+        funds=list(funds) or None,
+        shareclasses=list(shareclasses) or None,
+        start_date=start_date,
+        end_date=end_date,
+    )
+    if any(value is not None for value in book_filters.values()) and (
+        engine == "duckdb" or incremental or chunk_size is not None
+    ):
+        raise click.UsageError(
+            "--customer, --fund, --shareclass, --start_date and --end_date cannot "
+            "be combined with --engine duckdb, --incremental or --chunk_size"
+        )
+    if start_date is not None and end_date is not None and start_date > end_date:
+        raise click.UsageError("--start_date is after --end_date")
+
+    if engine == "duckdb":
+        if incremental or chunk_size is not None:
+            raise click.UsageError(
+                "--engine duckdb cannot be combined with --incremental or --chunk_size"
+            )
+        # imported here so that the pandas engine does not need duckdb installed
+        from src.duckdb_engine import calc_accounts_duckdb
+
+        with profiler.stage("calc") as stage:
+            account_values, impact = calc_accounts_duckdb(
+                data_path, threads=workers if workers > 1 else None
+            )
+            stage.rows = len(account_values)
+            stage.accounts = account_values["account"].nunique()
+        logger.info("Outputting impact and account values to %s", out_path)
+        out_path.mkdir(parents=True, exist_ok=True)
+        with profiler.stage("write", rows=len(account_values)):
+            write_account_values(account_values, out_path, output_format)
+            write_impact(impact, out_path, output_format)
+        return
+
+    if incremental:
+        if chunk_size is not None:
+            raise click.UsageError("--incremental cannot be combined with --chunk_size")
+        checkpoint = read_checkpoint(out_path)
+        after = None
+        if checkpoint is not None and not checkpoint.empty:
+            after = checkpoint["date"].iloc[0]
+        with profiler.stage("load") as stage:
+            # only fund returns and cashflows after the checkpoint are read
+            account_system = AccountingSystem.from_simulated_data(
+                data_path, after=after
+            )
+            stage.accounts = len(account_system.accounts)
+        with profiler.stage("calc", accounts=stage.accounts) as stage:
+            account_values, checkpoint = account_system.calc_accounts_incremental(
+                checkpoint, workers=workers, cache=calc_cache
+            )
+            stage.rows = len(account_values)
+        with profiler.stage("impact", accounts=stage.accounts):
+            impact = account_system.impact_from_checkpoint(checkpoint)
+
+        logger.info("Appending %s account values in %s", len(account_values), out_path)
+        out_path.mkdir(parents=True, exist_ok=True)
+        with profiler.stage("write", rows=len(account_values)):
+            write_account_values(account_values, out_path, output_format, append=True)
+            write_impact(impact, out_path, output_format)
+            write_checkpoint(checkpoint, out_path)
+        return
+
+    if chunk_size is not None:
+        if output_format == "csv":
+            raise click.UsageError(
+                "--chunk_size writes a dataset partitioned by fund; "
+                "use --format parquet or arrow"
+            )
+        logger.info("Outputting impact and account values to %s", out_path)
+        out_path.mkdir(parents=True, exist_ok=True)
+        # load, calc and write are interleaved chunk by chunk
+        with profiler.stage("stream"):
+            impact = AccountingSystem.stream_impact(
+                data_path,
+                chunk_size=chunk_size,
+                values_path=out_path / "account_values",
+                workers=workers,
+                output_format=output_format,
+                cache=calc_cache,
+            )
+        with profiler.stage("write", rows=len(impact)):
+            write_impact(impact, out_path, output_format)
+        return
+
+    with profiler.stage("load") as stage:
+        try:
+            account_system = AccountingSystem.from_simulated_data(
+                data_path, **book_filters
+            )
+        except NoMatchingAccountsError as err:
+            raise click.UsageError(str(err)) from err
+        stage.accounts = len(account_system.accounts)
+    with profiler.stage("calc", accounts=stage.accounts) as stage:
+        account_values = account_system.calc_accounts(workers=workers, cache=calc_cache)
+        stage.rows = len(account_values)
+    with profiler.stage("impact", rows=len(account_values), accounts=stage.accounts):
+        impact = account_system.calc_impact(account_values)
+
+    logger.info("Outputting impact and account values to %s", out_path)
     out_path.mkdir(parents=True, exist_ok=True)
-    account_values.to_csv(out_path / "account_values.csv")
-    impact.to_csv(out_path / "impact.csv")
+    with profiler.stage("write", rows=len(account_values)):
+        write_account_values(account_values, out_path, output_format)
+        write_impact(impact, out_path, output_format)
+
+
+@cli.command()
+@click.option(
+    "--data_path",
+    required=True,
+    type=str,
+    help="Path to simulated data",
+)
+@click.option("--host", default="127.0.0.1", type=str, help="Address to listen on")
+@click.option("--port", default=8765, type=int, help="Port to listen on")
+@click.option(
+    "--workers",
+    default=1,
+    type=int,
+    help="Number of processes across which to split accounts by fund",
+)
+@click.option(
+    "--cache/--no-cache",
+    default=True,
+    help="When the book is reloaded, only recalculate accounts whose inputs " "changed",
+)
+@click.option(
+    "--cache_dir",
+    default=None,
+    type=str,
+    help="Directory of the calc cache; defaults to ~/.cache/fund_accounting/calc",
+)
+@click.pass_obj
+def serve(
+    profiler: Profiler,
+    data_path: str,
+    host: str,
+    port: int,
+    workers: int,
+    cache: bool,
+    cache_dir: str,
+):
+    """Keep a book loaded and answer impact and account value queries over HTTP"""
+    from src.calc_cache import CalcCache, default_cache_dir
+    from src.server import BookServer, WarmBook
+
+    calc_cache = None
+    if cache:
+        calc_cache = CalcCache(default_cache_dir() if cache_dir is None else cache_dir)
+    with profiler.stage("load") as stage:
+        book = WarmBook(data_path, workers=workers, cache=calc_cache)
+        stage.accounts = len(book.system.accounts)
+    with BookServer((host, port), book) as server:
+        logger.info("Serving %s on http://%s:%s", data_path, *server.server_address)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
 
 
 if __name__ == "__main__":
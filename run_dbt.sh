@@ -1,2 +1,12 @@
 #!/bin/bash
-dbt run --project-dir fund_accounting --profiles-dir ./
+# usage: ./run_dbt.sh [data_path] [--full-refresh]
+# data_path is relative to fund_accounting/; by default the data_path var in
+# dbt_project.yml. Incremental models only load data newer than what is already
+# in fundaccounting.duckdb.
+if [ -n "$1" ] && [ "${1#--}" == "$1" ]; then
+  DATA_PATH="$1"
+  shift
+  dbt run --project-dir fund_accounting --profiles-dir ./ --vars "{data_path: '$DATA_PATH'}" "$@"
+else
+  dbt run --project-dir fund_accounting --profiles-dir ./ "$@"
+fi
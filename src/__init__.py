@@ -1,6 +1,31 @@
 """
 modules related to fund accounting and data simulation
+
+Simulator and AccountingSystem are imported on first use, so that importing
+src (e.g. for main.py --help) does not pull in pandas and numpy.
 """
+from importlib import import_module
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .accounting_system import AccountingSystem
+    from .simulator import Simulator
+
+_LAZY_ATTRIBUTES = {
+    "Simulator": ".simulator",
+    "AccountingSystem": ".accounting_system",
+}
+
+__all__ = list(_LAZY_ATTRIBUTES)
+
+
+def __getattr__(name: str):
+    if name not in _LAZY_ATTRIBUTES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(_LAZY_ATTRIBUTES[name], __name__), name)
+    globals()[name] = value
+    return value
+
 
-from .simulator import Simulator
-from .accounting_system import AccountingSystem
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -11,12 +11,24 @@ import logging
 
 import pandas as pd
 
+from src.business_calendar import BusinessCalendar
 from src.cashflow import CashFlow
 from src.customer import Customer
 from src.element import Element
+from src.engine import VALUE_COLUMNS, calculate_nav
 from src.fund import FundShareClass
+from src.metrics import RateLimitFilter
 
 logger = logging.getLogger(__name__)
+# calculate_values runs once per account; log a sample rather than every one
+logger.addFilter(RateLimitFilter())
+
+
+def account_names(
+    customer: pd.Series, fund: pd.Series, shareclass: pd.Series
+) -> pd.Series:
+    """vectorized Account.name: customer-fund_shareclass"""
+    return customer + "-" + fund + "_" + shareclass
 
 
 class Account(Element):
@@ -24,6 +36,8 @@ class Account(Element):
     A customer / shareclass pair
     """
 
+    __slots__ = ("customer", "shareclass", "cashflows", "initial_investment")
+
     def __init__(
         self,
         customer: Customer,
@@ -58,7 +72,9 @@ class Account(Element):
             }
         )
 
-    def calculate_values(self, gross_returns: pd.Series) -> pd.DataFrame:
+    def calculate_values(
+        self, gross_returns: pd.Series, calendar: BusinessCalendar = None
+    ) -> pd.DataFrame:
         """
         Given fund gross returns, and share class expenses, calculate personal net returns
 
@@ -68,6 +84,14 @@ class Account(Element):
           b. apply subscriptions / redemptions
           c. calculate expenses
           d. subtract day's expenses from account value
+
+        The day-by-day recurrence runs over float64 arrays in src.engine.calculate_nav.
+        gross_returns must cover each day (a ValueError is raised otherwise,
+        rather than NaN values).
+
+        :param calendar: the days to calculate, e.g. an AccountingSystem's
+        shared calendar, on which days without a cashflow have none; by default
+        the days of the account's cashflows
         """
         logger.info(
             "Calculating asset values for %s, %s",
@@ -75,27 +99,23 @@ class Account(Element):
             self.shareclass.name,
         )
 
+        cashflow = self.cashflows.cashflow
+        if calendar is None:
+            calendar = BusinessCalendar(cashflow.index)
         values = pd.DataFrame(
-            {"gross_return": gross_returns, "cashflow": self.cashflows.cashflow}
+            {
+                "gross_return": calendar.align(gross_returns),
+                "cashflow": calendar.align(cashflow, fill=0.0),
+            },
+            index=calendar.dates,
         )
-        values = pd.concat(
-            [
-                values,
-                pd.DataFrame(
-                    index=values.index, columns=["init_GAV", "GAV", "expense", "NAV"]
-                ),
-            ],
-            axis=1,
+        nav = calculate_nav(
+            values["gross_return"].to_numpy(),
+            values["cashflow"].to_numpy(),
+            initial_investment=self.initial_investment,
+            expense_ratio=self.shareclass.expense_ratio,
         )
-
-        # TODO: do we have to iterate? I think so.
-        prev_nav = self.initial_investment
-        for bday, row in values.iterrows():
-            values.loc[bday, "init_GAV"] = prev_nav * row["gross_return"]
-            values.loc[bday, "GAV"] = values.loc[bday, "init_GAV"] + row["cashflow"]
-            values.loc[bday, "expense"] = (
-                values.loc[bday, "GAV"] + self.shareclass.expense_ratio
-            )
-            values.loc[bday, "NAV"] = values.loc[bday, "GAV"] - values.loc[bday, "GAV"]
+        for col in VALUE_COLUMNS:
+            values[col] = nav[col]
 
         return values
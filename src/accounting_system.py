@@ -1,19 +1,100 @@
 """
 Orchestrator for the various tables and classes pertaining to fund performance
 """
+import datetime
 import logging
+import shutil
+from collections.abc import Mapping
 from pathlib import Path
-from typing import Dict
+from typing import Dict, Iterator, List, Sequence, Tuple, Union
 
+import numpy as np
 import pandas as pd
 
-from src.account import Account
+from src.account import Account, account_names
+from src.business_calendar import BusinessCalendar
+from src.calc_cache import CalcCache
 from src.cashflow import CashFlow
 from src.customer import Customer
+from src.element import LazyElements
+from src.engine import calculate_nav
 from src.fund import Fund, FundShareClass
+from src.parallel import calculate_nav_by_fund
+from src.registry import BookRegistry
+from src.scenarios import SCENARIO_BATCH_SIZE, calculate_scenario_expenses
+from src.storage import (
+    DATASET_FORMATS,
+    iter_table_batches,
+    read_cashflows,
+    read_tables,
+    write_dataset_part,
+)
 
 logger = logging.getLogger(__name__)
 
+ACCOUNT_COLUMNS = [
+    "customer",
+    "fund",
+    "shareclass",
+    "initial_investment",
+    "expense_ratio",
+]
+
+# upper bound on the (days x accounts x candidates) elements of each what_if pass
+WHAT_IF_CHUNK_ELEMENTS = 2**22
+
+# per-account state carried between incremental runs
+CHECKPOINT_COLUMNS = ["customer", "fund", "shareclass", "date", "NAV", "expense"]
+
+# columns read from each simulated table other than cashflows (see read_cashflows)
+LOAD_COLUMNS = {
+    "customers": ["name", "turnover"],
+    "funds": ["name", "start_date", "end_date", "return_params", "return_generator"],
+    "shareclasses": ["name", "fund", "expense_ratio"],
+    "accounts": ["customer", "fund", "shareclass", "initial_investment"],
+    "fund_returns": ["fund", "returns"],
+}
+
+
+class NoMatchingAccountsError(ValueError):
+    """filters given to AccountingSystem.from_simulated_data match no accounts"""
+
+
+def _book_filters(
+    customers: List[str] = None,
+    funds: List[str] = None,
+    shareclasses: List[str] = None,
+    end_date: datetime.date = None,
+    after: datetime.date = None,
+) -> Dict[str, List]:
+    """pyarrow row filters selecting part of a book, keyed by table name"""
+    filters = {}
+
+    def add(table: str, column: str, op: str, value):
+        filters.setdefault(table, []).append((column, op, value))
+
+    if customers is not None:
+        add("customers", "name", "in", list(customers))
+        add("accounts", "customer", "in", list(customers))
+    if funds is not None:
+        for table, column in [
+            ("funds", "name"),
+            ("shareclasses", "fund"),
+            ("accounts", "fund"),
+            ("fund_returns", "fund"),
+        ]:
+            add(table, column, "in", list(funds))
+    if shareclasses is not None:
+        add("shareclasses", "name", "in", list(shareclasses))
+        add("accounts", "shareclass", "in", list(shareclasses))
+    if end_date is not None:
+        add("fund_returns", "date", "<=", pd.Timestamp(end_date))
+        add("cashflows", "date", "<=", pd.Timestamp(end_date))
+    if after is not None:
+        add("fund_returns", "date", ">", pd.Timestamp(after))
+        add("cashflows", "date", ">", pd.Timestamp(after))
+    return filters
+
 
 class AccountingSystem:
     """
@@ -29,7 +110,20 @@ class AccountingSystem:
         funds: Dict[str, Fund],
         accounts: Dict[str, Account],
         shareclasses: Dict[str, FundShareClass],
+        account_table: pd.DataFrame = None,
+        registry: BookRegistry = None,
+        start_date: datetime.date = None,
     ):
+        """
+        :param account_table: optional columnar form of accounts (see
+        account_table); when missing, it is derived from the Account objects
+        :param registry: the integer-keyed arrays the elements were built from,
+        when loaded from tables. Batched calculations read cashflows from its
+        CSR arrays; without one, they stack the accounts' CashFlow series.
+        :param start_date: first date reported by calc_accounts (and so
+        calc_impact). Earlier dates are still calculated, as they carry NAV
+        into the window.
+        """
         self.data_path = data_path
         self.cashflows = cashflows
         self.customers = customers
@@ -37,87 +131,695 @@ class AccountingSystem:
         self.funds = funds
         self.accounts = accounts
         self.shareclasses = shareclasses
+        self._account_table = account_table
+        self.registry = registry
+        self.start_date = None if start_date is None else pd.Timestamp(start_date)
+        # set when fund returns and cashflows were only read after this date
+        self.loaded_after = None
         self.account_values = None  # holder for calculations of expenses
 
     @classmethod
-    def from_simulated_data(cls, data_path: Path):
-        """Generate set of accounts using data simulated by Simulator"""
+    def from_simulated_data(
+        cls,
+        data_path: Path,
+        customers: List[str] = None,
+        funds: List[str] = None,
+        shareclasses: List[str] = None,
+        start_date: datetime.date = None,
+        end_date: datetime.date = None,
+        after: datetime.date = None,
+    ):
+        """
+        Generate set of accounts using data simulated by Simulator
+
+        Tables are read with column projection and related with joins on the
+        columnar tables; Customer, Fund, FundShareClass, CashFlow and Account
+        objects are only built when looked up.
+
+        The filters are pushed down into the parquet reads, so only matching
+        accounts, and fund returns and cashflows up to end_date, are read and
+        calculated. Results match slicing those of the whole book.
+
+        :param customers: only load accounts of these customers
+        :param funds: only load accounts in these funds
+        :param shareclasses: only load accounts in shareclasses of these names
+        :param start_date: first date reported by calc_accounts; history
+        before it is still read, as it determines NAV on start_date
+        :param end_date: last date loaded
+        :param after: only read fund returns and cashflows after this date, to
+        continue an incremental checkpoint taken on it (see
+        calc_accounts_incremental)
+        :raises NoMatchingAccountsError: if no accounts match the filters
+        """
         logger.info("Generating accounting system from data in %s", data_path)
         data_path = Path(data_path)
+        filters = _book_filters(customers, funds, shareclasses, end_date, after)
+        if customers is None and funds is None and shareclasses is None:
+            tables = read_tables(
+                data_path, {**LOAD_COLUMNS, "cashflows": None}, filters=filters
+            )
+        else:
+            # cashflows are keyed by account name, so find the accounts first
+            tables = read_tables(data_path, LOAD_COLUMNS, filters=filters)
+            account_df = tables["accounts"]
+            if account_df.empty:
+                raise NoMatchingAccountsError(
+                    f"no accounts in {data_path} match customers {customers}, "
+                    f"funds {funds} and shareclasses {shareclasses}"
+                )
+            tables["cashflows"] = read_cashflows(
+                data_path,
+                accounts=list(
+                    account_names(
+                        account_df.customer, account_df.fund, account_df.shareclass
+                    )
+                ),
+                filters=filters.get("cashflows"),
+            )
+        system = cls.from_tables(data_path, tables, start_date=start_date)
+        system.loaded_after = None if after is None else pd.Timestamp(after)
+        return system
+
+    @classmethod
+    def iter_simulated_data(
+        cls, data_path: Path, chunk_size: int
+    ) -> Iterator["AccountingSystem"]:
+        """
+        Generate accounting systems over consecutive chunks of at most chunk_size
+        accounts from data simulated by Simulator
 
-        # cashflows.parquet
-        cashflow_df = pd.read_parquet(data_path / "cashflows.parquet")
-        cashflows = [
-            CashFlow.from_series(series) for nm, series in cashflow_df.iteritems()
-        ]
-        cashflows = {cf.name: cf for cf in cashflows}
-
-        # customers.parquet
-        customer_df = pd.read_parquet(data_path / "customers.parquet")
-        customers = [Customer.from_series(row) for i, row in customer_df.iterrows()]
-        customers = {cus.name: cus for cus in customers}
-
-        # fund_returns.parquet
-        fund_returns = pd.read_parquet(data_path / "fund_returns.parquet")
-
-        # funds.parquet
-        fund_df = pd.read_parquet(data_path / "funds.parquet")
-        funds = [Fund.from_series(row) for i, row in fund_df.iterrows()]
-        funds = {fund.name: fund for fund in funds}
-
-        # shareclasses.parquet
-        shareclass_df = pd.read_parquet(data_path / "shareclasses.parquet")
-        shareclasses = [
-            FundShareClass.from_series(row, funds)
-            for i, row in shareclass_df.iterrows()
-        ]
-        shareclasses = {shareclass.name: shareclass for shareclass in shareclasses}
-
-        # accounts.parquet
-        account_df = pd.read_parquet(data_path / "accounts.parquet")
-        accounts = {}
-        for i, row in account_df.iterrows():
-            account = Account(
-                customer=customers[row["customer"]],
-                shareclass=shareclasses[row["shareclass"]],
-                cashflows=cashflows[
-                    f"{row['customer']}-{row['fund']}_{row['shareclass']}"
+        Only one chunk's accounts and cashflow rows are read at a time, so
+        memory is bounded by chunk_size rather than by the size of the book.
+        """
+        logger.info("Reading accounts from %s in chunks of %s", data_path, chunk_size)
+        data_path = Path(data_path)
+        tables = read_tables(
+            data_path,
+            {
+                name: columns
+                for name, columns in LOAD_COLUMNS.items()
+                if name != "accounts"
+            },
+        )
+        for account_df in iter_table_batches(
+            data_path, "accounts", chunk_size, columns=LOAD_COLUMNS["accounts"]
+        ):
+            cashflow_df = read_cashflows(
+                data_path,
+                accounts=list(
+                    account_names(
+                        account_df.customer, account_df.fund, account_df.shareclass
+                    )
+                ),
+            )
+            yield cls.from_tables(
+                data_path, {**tables, "accounts": account_df, "cashflows": cashflow_df}
+            )
+
+    @classmethod
+    def from_tables(
+        cls,
+        data_path: Path,
+        tables: Dict[str, pd.DataFrame],
+        start_date: datetime.date = None,
+    ):
+        """
+        Generate set of accounts from simulated tables already in memory
+
+        :param tables: frames keyed like storage.TABLE_NAMES, with at least the
+        LOAD_COLUMNS of each, and long-format cashflows as from read_cashflows
+        :param start_date: first date reported by calc_accounts
+        """
+        registry = BookRegistry.from_tables(tables)
+
+        customers = LazyElements(
+            registry.customers,
+            lambda name: Customer(
+                name=name, turnover=registry.turnover[registry.customers.get_loc(name)]
+            ),
+        )
+
+        fund_df = tables["funds"].set_index("name", drop=False)
+        funds = LazyElements(
+            fund_df.index, lambda name: Fund.from_series(fund_df.loc[name].copy())
+        )
+
+        def make_shareclass(key: str) -> FundShareClass:
+            shareclass_id = registry.shareclasses.get_loc(key)
+            return FundShareClass(
+                name=registry.shareclass_name[shareclass_id],
+                fund=funds[registry.shareclass_fund[shareclass_id]],
+                expense_ratio=registry.expense_ratio[shareclass_id],
+            )
+
+        shareclasses = LazyElements(registry.shareclasses, make_shareclass)
+
+        def make_cashflow(name: str) -> CashFlow:
+            rows = registry.cashflow_rows(registry.accounts.get_loc(name))
+            return CashFlow.from_sparse(
+                registry.cashflow_days[rows],
+                registry.cashflow_amounts[rows],
+                index=registry.dates,
+                name=name,
+            )
+
+        cashflows = LazyElements(registry.accounts, make_cashflow)
+
+        def make_account(name: str) -> Account:
+            account_id = registry.accounts.get_loc(name)
+            return Account(
+                customer=customers[
+                    registry.customers[registry.account_customer[account_id]]
+                ],
+                shareclass=shareclasses[
+                    registry.shareclasses[registry.account_shareclass[account_id]]
                 ],
-                initial_investment=row["initial_investment"],
+                cashflows=cashflows[name],
+                initial_investment=registry.initial_investment[account_id],
             )
-            accounts[account.name] = account
 
         return cls(
             data_path=data_path,
             cashflows=cashflows,
             customers=customers,
-            fund_returns=fund_returns,
+            fund_returns=tables["fund_returns"],
             funds=funds,
-            accounts=accounts,
+            accounts=LazyElements(registry.accounts, make_account),
             shareclasses=shareclasses,
+            account_table=registry.account_table(),
+            registry=registry,
+            start_date=start_date,
         )
 
+    @property
+    def account_table(self) -> pd.DataFrame:
+        """
+        One row per account, indexed by account name, with customer, fund,
+        shareclass, initial_investment and expense_ratio columns
+        """
+        if self._account_table is None:
+            self._account_table = pd.DataFrame(
+                [
+                    {
+                        "customer": account.customer.name,
+                        "fund": account.shareclass.fund.name,
+                        "shareclass": account.shareclass.name,
+                        "initial_investment": account.initial_investment,
+                        "expense_ratio": account.shareclass.expense_ratio,
+                    }
+                    for account in self.accounts.values()
+                ],
+                index=pd.Index(list(self.accounts), dtype=object),
+                columns=ACCOUNT_COLUMNS,
+            )
+        return self._account_table
+
+    @property
+    def fund_returns(self) -> pd.DataFrame:
+        """long-format (date, fund, returns) gross fund returns"""
+        return self._fund_returns
+
+    @fund_returns.setter
+    def fund_returns(self, fund_returns: pd.DataFrame):
+        """set fund returns and rebuild the fund-keyed indexes over them"""
+        self._fund_returns = fund_returns
+        self._dates = None
+        self._calendar = None
+
+        # contiguous per-fund slices of one fund-sorted copy of the returns
+        order = np.argsort(fund_returns.fund.to_numpy(dtype=object), kind="stable")
+        self._sorted_returns = fund_returns.returns.iloc[order]
+        fund_names, starts = np.unique(
+            fund_returns.fund.to_numpy(dtype=object)[order], return_index=True
+        )
+        ends = np.append(starts[1:], len(order))
+        self._fund_slices = {
+            name: slice(start, end)
+            for name, start, end in zip(fund_names, starts, ends)
+        }
+
+        # (date x fund) matrix for batched calculations
+        self._fund_return_matrix = fund_returns.pivot(columns="fund", values="returns")
+
     def returns_for_fund(self, fund_name: str) -> pd.Series:
         """Filter returns to the stated fund_name, return a series"""
         # check if fund name exists in data
-        if not fund_name in self.fund_returns.fund.unique():
+        if fund_name not in self._fund_slices:
             raise ValueError(f"{fund_name} does not appear in loaded fund_returns")
-        return self.fund_returns[self.fund_returns.fund == fund_name].returns
+        return self._sorted_returns.iloc[self._fund_slices[fund_name]]
+
+    def calc_accounts(
+        self, batched: bool = True, workers: int = 1, cache: CalcCache = None
+    ) -> pd.DataFrame:
+        """
+        Calculate net returns, expenses, etc. for all accounts
 
-    def calc_accounts(self):
-        """Calculate net returns, expenses, etc. for all accounts"""
+        :param batched: run every account through one (days x accounts) array
+        calculation rather than calling Account.calculate_values per account
+        :param workers: for batched calculations, the number of processes
+        across which to partition the accounts by fund
+        :param cache: for batched calculations, reuse the values of accounts
+        whose inputs are unchanged since they were cached, and cache the rest
+        """
         logger.info("Calculating returns, expenses, etc. for all accounts")
+        if batched:
+            return self._calc_accounts_batched(workers=workers, cache=cache)
         account_values = []
+        calendar = self.calendar
         for account_nm, account in self.accounts.items():
             tmp_vals = account.calculate_values(
-                self.returns_for_fund(account.shareclass.fund.name)
+                self.returns_for_fund(account.shareclass.fund.name), calendar
             )
             tmp_vals["account"] = account_nm
             tmp_vals["customer"] = account.customer.name
             tmp_vals["fund"] = account.shareclass.fund.name
             tmp_vals["shareclass"] = account.shareclass.name
             account_values.append(tmp_vals)
-        return pd.concat(account_values)
+        account_values = pd.concat(account_values).rename_axis("date")
+        if self.start_date is not None:
+            account_values = account_values[account_values.index >= self.start_date]
+        return account_values
+
+    @property
+    def dates(self) -> pd.DatetimeIndex:
+        """every date with a fund return or a cashflow"""
+        if self._dates is None:
+            dates = self._fund_return_matrix.index
+            if self.registry is not None:
+                registry = self.registry
+                dates = dates.union(registry.dates[np.unique(registry.cashflow_days)])
+            else:
+                for cashflow in self.cashflows.values():
+                    dates = dates.union(cashflow.cashflow.index)
+            self._dates = dates.rename("date")
+        return self._dates
+
+    @property
+    def calendar(self) -> BusinessCalendar:
+        """the days calculated, numbered from 0 (see dates)"""
+        if self._calendar is None:
+            self._calendar = BusinessCalendar(self.dates)
+        return self._calendar
+
+    def _cashflow_matrix(
+        self, account_names: List[str], dates: pd.DatetimeIndex
+    ) -> np.ndarray:
+        """dense (date x account) cashflows for the named accounts"""
+        if self.registry is None:
+            calendar = BusinessCalendar(dates)
+            matrix = np.zeros((len(dates), len(account_names)))
+            for col, name in enumerate(account_names):
+                matrix[:, col] = calendar.align(
+                    self.accounts[name].cashflows.cashflow, fill=0.0
+                )
+            return matrix
+        # gather only these accounts' CSR rows, so a batch costs its own
+        # cashflows rather than the whole book's
+        registry = self.registry
+        account_ids = registry.accounts.get_indexer(account_names)
+        starts = registry.cashflow_offsets[account_ids]
+        lengths = registry.cashflow_offsets[account_ids + 1] - starts
+        first_out = np.cumsum(lengths) - lengths
+        rows = np.repeat(starts - first_out, lengths) + np.arange(lengths.sum())
+        cols = np.repeat(np.arange(len(account_names)), lengths)
+        # registry day -> position in `dates`, -1 outside them
+        day_idx = dates.get_indexer(registry.dates)[registry.cashflow_days[rows]]
+        keep = day_idx >= 0
+        flat = np.bincount(
+            day_idx[keep] * len(account_names) + cols[keep],
+            weights=registry.cashflow_amounts[rows][keep],
+            minlength=len(dates) * len(account_names),
+        )
+        return flat.reshape(len(dates), len(account_names))
+
+    def _fund_return_columns(
+        self, fund_names: np.ndarray, dates: pd.DatetimeIndex
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (dates x funds) gross returns, and the column of each named fund
+
+        :raises ValueError: if a fund has no returns, or lacks any of the dates
+        """
+        if len(dates) == 0:  # e.g. nothing new since an incremental checkpoint
+            return np.empty((0, len(fund_names))), np.arange(len(fund_names))
+        fund_returns = self._fund_return_matrix
+        fund_idx = fund_returns.columns.get_indexer(fund_names)
+        if (fund_idx < 0).any():
+            missing = fund_names[int(np.argmin(fund_idx))]
+            raise ValueError(f"{missing} does not appear in loaded fund_returns")
+
+        # align returns to the calculated days by offset, refusing gaps rather
+        # than calculating NaN values from them
+        day_idx = fund_returns.index.get_indexer(dates)
+        fund_matrix = fund_returns.to_numpy(dtype=float)[np.maximum(day_idx, 0)]
+        fund_matrix[day_idx < 0] = np.nan
+        missing_days = np.isnan(fund_matrix[:, fund_idx]).sum(axis=0)
+        if missing_days.any():
+            account = int(np.argmax(missing_days > 0))
+            raise ValueError(
+                f"{fund_names[account]} returns are missing "
+                f"{missing_days[account]} of {len(dates)} days"
+            )
+        return fund_matrix, fund_idx
+
+    def _calc_accounts_batched(
+        self,
+        workers: int = 1,
+        accounts: pd.DataFrame = None,
+        after: pd.Timestamp = None,
+        initial_nav: np.ndarray = None,
+        cache: CalcCache = None,
+    ) -> pd.DataFrame:
+        """
+        Stack cashflows and fund gross returns into (days x accounts) matrices
+        and run the NAV recurrence for every account in one pass.
+
+        Dates are those with fund returns or cashflows. Output matches
+        calc_accounts(batched=False), except that the label columns are
+        categorical.
+
+        :param accounts: rows of account_table to calculate; all by default
+        :param after: only calculate dates after this one
+        :param initial_nav: NAV of each account before the first date
+        calculated; initial_investment by default
+        :param cache: calc cache to read unchanged accounts from and store
+        newly calculated ones in
+        """
+        if accounts is None:
+            accounts = self.account_table
+        account_names = list(accounts.index)
+        fund_names = accounts.fund.to_numpy(dtype=object)
+
+        dates = self.dates
+        if after is not None:
+            dates = dates[dates > after]
+        cash = self._cashflow_matrix(account_names, dates)
+        fund_matrix, fund_idx = self._fund_return_columns(fund_names, dates)
+        gross = fund_matrix[:, fund_idx]
+        if initial_nav is None:
+            initial_nav = accounts.initial_investment.to_numpy(dtype=float)
+        expense_ratio = accounts.expense_ratio.to_numpy(dtype=float)
+
+        def calculate(cols) -> Dict[str, np.ndarray]:
+            if workers > 1:
+                return calculate_nav_by_fund(
+                    fund_matrix,
+                    fund_idx[cols],
+                    cash[:, cols],
+                    initial_nav[cols],
+                    expense_ratio[cols],
+                    workers,
+                )
+            return calculate_nav(
+                gross[:, cols], cash[:, cols], initial_nav[cols], expense_ratio[cols]
+            )
+
+        if cache is None:
+            values = calculate(slice(None))
+        else:
+            keys = cache.fingerprints(dates, gross, cash, initial_nav, expense_ratio)
+            found, values = cache.load(keys, len(dates))
+            logger.info(
+                "Reusing %s of %s accounts from the calc cache", found.sum(), len(found)
+            )
+            if not found.all():
+                missing = np.flatnonzero(~found)
+                calculated = calculate(missing)
+                for col, matrix in calculated.items():
+                    values[col][:, missing] = matrix
+                cache.store(keys[missing], calculated)
+
+        # report only from start_date, though NAV was carried from before it
+        first = 0 if self.start_date is None else dates.searchsorted(self.start_date)
+        dates = dates[first:]
+        n_days = len(dates)
+        columns = {"gross_return": gross, "cashflow": cash, **values}
+        account_values = pd.DataFrame(
+            {col: matrix[first:].ravel(order="F") for col, matrix in columns.items()},
+            index=dates[np.tile(np.arange(n_days), len(accounts))],
+        )
+        labels = {
+            "account": accounts.index,
+            "customer": accounts.customer,
+            "fund": accounts.fund,
+            "shareclass": accounts.shareclass,
+        }
+        for col, per_account in labels.items():
+            codes, categories = pd.factorize(
+                np.asarray(per_account, dtype=object), sort=True
+            )
+            account_values[col] = pd.Categorical.from_codes(
+                np.repeat(codes, n_days), categories=categories
+            )
+        return account_values
+
+    def calc_accounts_incremental(
+        self,
+        checkpoint: pd.DataFrame = None,
+        workers: int = 1,
+        cache: CalcCache = None,
+    ) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        Calculate account values only for dates after a previous run
+
+        Accounts in the checkpoint continue from their checkpointed NAV on the
+        dates after the checkpoint date; accounts new since then are calculated
+        over every date. Values on checkpointed dates are never recalculated.
+
+        A system loaded with from_simulated_data(after=checkpoint date) holds
+        only the new dates, so a run reads and calculates in proportion to them;
+        the full history of any new accounts is then read separately.
+
+        :param checkpoint: as returned by a previous call; None starts afresh
+        :param cache: calc cache to reuse and store account values in
+        :return: account values for the newly calculated dates, and the updated
+        checkpoint: per account, the last date calculated, its NAV and the
+        running total of expenses
+        """
+        accounts = self.account_table
+        if checkpoint is None:
+            checkpoint = pd.DataFrame(
+                columns=CHECKPOINT_COLUMNS, index=pd.Index([], dtype=object)
+            ).astype({"date": "datetime64[ns]", "NAV": float, "expense": float})
+        if checkpoint["date"].nunique() > 1:
+            raise ValueError("checkpointed accounts are not all at the same date")
+        if (
+            self.loaded_after is not None
+            and not (checkpoint["date"] == self.loaded_after).all()
+        ):
+            raise ValueError(
+                f"book was loaded after {self.loaded_after:%Y-%m-%d}, "
+                "not the checkpoint date"
+            )
+
+        known = accounts.index.isin(checkpoint.index)
+        account_values = []
+        if known.any():
+            logger.info(
+                "Calculating accounts after checkpoint %s", checkpoint["date"].iloc[0]
+            )
+            account_values.append(
+                self._calc_accounts_batched(
+                    workers=workers,
+                    cache=cache,
+                    accounts=accounts[known],
+                    after=checkpoint["date"].iloc[0],
+                    initial_nav=checkpoint.NAV.reindex(accounts.index[known]).to_numpy(
+                        dtype=float
+                    ),
+                )
+            )
+        if not known.all():
+            logger.info("Calculating %s accounts without a checkpoint", (~known).sum())
+            new_accounts = accounts[~known]
+            history = self
+            if self.loaded_after is not None:
+                history = AccountingSystem.from_simulated_data(
+                    self.data_path,
+                    customers=new_accounts.customer.unique(),
+                    funds=new_accounts.fund.unique(),
+                    shareclasses=new_accounts.shareclass.unique(),
+                )
+            account_values.append(
+                history._calc_accounts_batched(
+                    workers=workers, cache=cache, accounts=new_accounts
+                )
+            )
+        account_values = pd.concat(account_values)
+        return account_values, self.update_checkpoint(checkpoint, account_values)
+
+    @staticmethod
+    def update_checkpoint(
+        checkpoint: pd.DataFrame, account_values: pd.DataFrame
+    ) -> pd.DataFrame:
+        """roll a checkpoint forward over newly calculated account values"""
+        if account_values.empty:
+            return checkpoint
+        account_values = account_values.assign(
+            date=account_values.index,
+            account=account_values.account.astype(object),
+        )
+        latest = account_values.drop_duplicates("account", keep="last").set_index(
+            "account"
+        )[["customer", "fund", "shareclass", "date", "NAV"]]
+        latest = latest.astype(
+            {col: object for col in ["customer", "fund", "shareclass"]}
+        )
+        latest["expense"] = (
+            checkpoint.expense.reindex(latest.index).fillna(0.0)
+            + account_values.groupby("account", sort=False).expense.sum()
+        )
+        unchanged = checkpoint[~checkpoint.index.isin(latest.index)]
+        if not unchanged.empty:
+            latest = pd.concat([unchanged, latest[CHECKPOINT_COLUMNS]])
+        checkpoint = latest[CHECKPOINT_COLUMNS]
+        checkpoint.index.name = "account"
+        return checkpoint
+
+    def impact_from_checkpoint(self, checkpoint: pd.DataFrame) -> pd.Series:
+        """Calculate shareclass impact from a checkpoint's running expense totals"""
+        return self.impact_from_expenses(
+            checkpoint.groupby(["customer", "fund", "shareclass"]).expense.sum()
+        )
+
+    def what_if(
+        self,
+        expense_ratios: Union[Dict[str, Sequence[float]], Sequence[float]] = None,
+        accounts: pd.DataFrame = None,
+    ) -> pd.DataFrame:
+        """
+        Price accounts under candidate expense ratios for their fund
+
+        Every account is recalculated under each candidate, and under its own
+        expense ratio, in one broadcast pass of the engine over the accounts'
+        shared gross returns and cashflows, i.e. on (days x accounts x
+        candidates) arrays. Accounts are taken in batches of at most
+        WHAT_IF_CHUNK_ELEMENTS array elements. No Account objects are built.
+
+        :param expense_ratios: candidate ratios per fund name, or one sequence
+        for every fund; by default the ratios of each fund's shareclasses.
+        Accounts of funds without candidates are left out, leaving an empty
+        frame if no account has any.
+        :param accounts: rows of account_table to price; all by default
+        :return: frame indexed by customer, fund, shareclass and candidate
+        expense_ratio, with the total expense under the candidate and its
+        impact: that total less the total under the account's own shareclass
+        """
+        if accounts is None:
+            accounts = self.account_table
+        if expense_ratios is None:
+            expense_ratios = accounts.groupby("fund").expense_ratio.unique().to_dict()
+        elif not isinstance(expense_ratios, Mapping):
+            expense_ratios = {fund: expense_ratios for fund in accounts.fund.unique()}
+        accounts = accounts[accounts.fund.isin(list(expense_ratios))]
+        logger.info("Pricing %s accounts under candidate expense ratios", len(accounts))
+
+        # column 0 is each account's own ratio; funds with fewer candidates
+        # are padded with NaN, which is dropped from the output
+        n_candidates = max(
+            (len(ratios) for ratios in expense_ratios.values()), default=0
+        )
+        candidates = np.full((len(accounts), 1 + n_candidates), np.nan)
+        candidates[:, 0] = accounts.expense_ratio.to_numpy(dtype=float)
+        fund_names = accounts.fund.to_numpy(dtype=object)
+        for fund, ratios in expense_ratios.items():
+            candidates[fund_names == fund, 1 : 1 + len(ratios)] = ratios
+
+        dates = self.dates
+        fund_matrix, fund_idx = self._fund_return_columns(fund_names, dates)
+        cash = self._cashflow_matrix(list(accounts.index), dates)
+        initial_investment = accounts.initial_investment.to_numpy(dtype=float)
+        total_expense = np.empty_like(candidates)
+        batch_size = max(
+            1, WHAT_IF_CHUNK_ELEMENTS // max(len(dates) * candidates.shape[1], 1)
+        )
+        for start in range(0, len(accounts), batch_size):
+            batch = slice(start, start + batch_size)
+            values = calculate_nav(
+                fund_matrix[:, fund_idx[batch], None],
+                cash[:, batch, None],
+                initial_investment[batch, None],
+                candidates[batch],
+            )
+            total_expense[batch] = values["expense"].sum(axis=0)
+
+        account_idx, candidate_idx = np.nonzero(~np.isnan(candidates[:, 1:]))
+        what_if = pd.DataFrame(
+            {
+                "expense": total_expense[account_idx, candidate_idx + 1],
+                "impact": total_expense[account_idx, candidate_idx + 1]
+                - total_expense[account_idx, 0],
+            },
+            index=pd.MultiIndex.from_arrays(
+                [
+                    accounts.customer.to_numpy()[account_idx],
+                    fund_names[account_idx],
+                    accounts.shareclass.to_numpy()[account_idx],
+                    candidates[account_idx, candidate_idx + 1],
+                ],
+                names=["customer", "fund", "shareclass", "expense_ratio"],
+            ),
+        )
+        return what_if.sort_index()
+
+    def calc_impact_scenarios(
+        self,
+        n_scenarios: int,
+        seed: int = None,
+        batch_size: int = SCENARIO_BATCH_SIZE,
+        workers: int = 1,
+        quantiles: Sequence[float] = (0.05, 0.5, 0.95),
+    ) -> pd.DataFrame:
+        """
+        Distribution of shareclass impact over simulated fund return scenarios
+
+        Each fund's returns are redrawn n_scenarios times from its
+        return_generator and return_params, on the loaded dates; cashflows,
+        initial investments and expense ratios are as loaded. See
+        src.scenarios for batching and seeding.
+
+        :param seed: seed for the scenarios; fresh entropy if None
+        :param batch_size: scenarios calculated at once, which bounds memory
+        :param workers: number of processes across which to run the batches
+        :param quantiles: quantiles of impact to report
+        :return: frame indexed by customer, fund and shareclass, with the mean,
+        standard deviation and quantiles of impact across scenarios, for every
+        shareclass but the first of each customer and fund (see calc_impact)
+        """
+        accounts = self.account_table
+        fund_names, fund_idx = np.unique(
+            accounts.fund.to_numpy(dtype=object), return_inverse=True
+        )
+        dates = self.dates
+        expenses = calculate_scenario_expenses(
+            [self.funds[name] for name in fund_names],
+            fund_idx,
+            BusinessCalendar(dates),
+            self._cashflow_matrix(list(accounts.index), dates),
+            accounts.initial_investment.to_numpy(dtype=float),
+            accounts.expense_ratio.to_numpy(dtype=float),
+            n_scenarios,
+            seed=seed,
+            batch_size=batch_size,
+            workers=workers,
+        )
+        total_expenses = (
+            pd.DataFrame(
+                expenses,
+                index=pd.MultiIndex.from_frame(
+                    accounts[["customer", "fund", "shareclass"]]
+                ),
+            )
+            .groupby(["customer", "fund", "shareclass"])
+            .sum()
+        )
+        impact = total_expenses.groupby(["customer", "fund"]).diff().dropna(how="all")
+        summary = pd.DataFrame(
+            {"mean": impact.mean(axis=1), "std": impact.std(axis=1)}, index=impact.index
+        )
+        for quantile in quantiles:
+            summary[f"q{quantile:g}"] = impact.quantile(quantile, axis=1)
+        return summary
 
     def calc_impact(self, account_values: pd.DataFrame):
         """Calculate the impact between different share classes for all accounts"""
@@ -125,8 +827,69 @@ class AccountingSystem:
         # calc_accounts. We'd need to know which should be the counterfactual shareclass
         # for each fund
         logger.info("Calculating shareclass impact for all accounts")
-        total_expenses = account_values.groupby(
-            ["customer", "fund", "shareclass"]
+        return self.impact_from_expenses(self.total_expenses(account_values))
+
+    @staticmethod
+    def total_expenses(account_values: pd.DataFrame) -> pd.Series:
+        """Total expenses per customer, fund and shareclass"""
+        return account_values.groupby(
+            ["customer", "fund", "shareclass"], observed=True
         ).expense.sum()
-        impact = total_expenses.groupby(["customer", "fund"]).diff()
-        return impact
+
+    @staticmethod
+    def impact_from_expenses(total_expenses: pd.Series) -> pd.Series:
+        """Difference in total expenses between shareclasses of each customer/fund"""
+        return total_expenses.groupby(["customer", "fund"], observed=True).diff()
+
+    @classmethod
+    def stream_impact(
+        cls,
+        data_path: Path,
+        chunk_size: int,
+        values_path: Path = None,
+        workers: int = 1,
+        output_format: str = "parquet",
+        cache: CalcCache = None,
+    ) -> pd.Series:
+        """
+        Calculate shareclass impact chunk by chunk (see iter_simulated_data)
+
+        Expense totals are aggregated as each chunk is calculated, so the full
+        daily history is never held in memory at once.
+
+        :param values_path: if given, each chunk's daily account values are
+        appended to a dataset here, partitioned by fund
+        :param workers: processes to use for each chunk's calculation
+        :param output_format: file format of the values dataset, parquet or
+        arrow
+        :param cache: calc cache to reuse and store account values in
+        """
+        logger.info("Streaming shareclass impact for accounts in %s", data_path)
+        if values_path is not None:
+            if output_format not in DATASET_FORMATS:
+                raise ValueError(f"{output_format} is not one of {DATASET_FORMATS}")
+            values_path = Path(values_path)
+            if values_path.exists():
+                shutil.rmtree(values_path)
+        total_expenses = []
+        for part, system in enumerate(cls.iter_simulated_data(data_path, chunk_size)):
+            account_values = system.calc_accounts(workers=workers, cache=cache)
+            total_expenses.append(
+                cls.total_expenses(account_values)
+                .reset_index()
+                .astype({col: object for col in ["customer", "fund", "shareclass"]})
+            )
+            if values_path is not None:
+                write_dataset_part(
+                    account_values,
+                    values_path,
+                    part,
+                    ["fund"],
+                    output_format=output_format,
+                )
+        total_expenses = (
+            pd.concat(total_expenses)
+            .groupby(["customer", "fund", "shareclass"])
+            .expense.sum()
+        )
+        return cls.impact_from_expenses(total_expenses)
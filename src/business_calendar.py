@@ -0,0 +1,104 @@
+"""
+Trading days shared by fund returns, cashflows and accounts
+
+A BusinessCalendar numbers its days 0, 1, 2... Series are stored as arrays
+aligned to those offsets, so matching returns with cashflows is array indexing
+against one calendar rather than a pandas index join, which would silently
+introduce NaN where the indexes disagree.
+"""
+import datetime
+from typing import List, Union
+
+import numpy as np
+import pandas as pd
+from pandas.tseries import holiday
+
+Holidays = Union[str, holiday.AbstractHolidayCalendar, List[datetime.date]]
+
+
+class BusinessCalendar:
+    """
+    Business days, optionally excluding holidays, mapped to integer offsets
+
+    :param dates: the days of the calendar, in order
+    """
+
+    __slots__ = ("dates",)
+
+    def __init__(self, dates: pd.DatetimeIndex):
+        dates = pd.DatetimeIndex(dates)
+        if not dates.is_monotonic_increasing or not dates.is_unique:
+            raise ValueError("calendar dates must be unique and increasing")
+        self.dates = dates.rename("date")
+
+    @classmethod
+    def from_range(
+        cls,
+        start_date: datetime.date,
+        end_date: datetime.date,
+        holidays: Holidays = None,
+    ) -> "BusinessCalendar":
+        """
+        Weekdays from start_date to end_date inclusive, less holidays
+
+        :param holidays: a pandas holiday calendar or the name of one in
+        pandas.tseries.holiday (e.g. "USFederalHolidayCalendar"), or a list of
+        dates
+        """
+        if isinstance(holidays, str):
+            holidays = getattr(holiday, holidays)()
+        if isinstance(holidays, holiday.AbstractHolidayCalendar):
+            holidays = holidays.holidays(start_date, end_date)
+        return cls(
+            pd.bdate_range(
+                start_date, end_date, freq="C", holidays=holidays, name="date"
+            )
+        )
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, BusinessCalendar) and self.dates.equals(other.dates)
+
+    def offsets(self, dates) -> np.ndarray:
+        """
+        Day offsets of the given dates
+
+        :raises KeyError: if any date is not in the calendar
+        """
+        offsets = self.dates.get_indexer(pd.DatetimeIndex(dates))
+        if (offsets < 0).any():
+            missing = pd.DatetimeIndex(dates)[offsets < 0]
+            raise KeyError(
+                f"{len(missing)} dates are not in the calendar, e.g. {missing[0]}"
+            )
+        return offsets
+
+    def align(self, series: pd.Series, fill: float = None) -> np.ndarray:
+        """
+        Values of a date-indexed series at each day of the calendar
+
+        Dates outside the calendar are ignored.
+
+        :param fill: value for calendar days missing from the series; if None,
+        every calendar day must be present
+        :raises ValueError: if fill is None and calendar days are missing
+        """
+        offsets = self.dates.get_indexer(pd.DatetimeIndex(series.index))
+        inside = offsets >= 0
+        values = np.full(len(self), np.nan if fill is None else fill, dtype=float)
+        values[offsets[inside]] = series.to_numpy(dtype=float)[inside]
+        if fill is None:
+            found = np.zeros(len(self), dtype=bool)
+            found[offsets[inside]] = True
+            if not found.all():
+                raise ValueError(
+                    f"{series.name} is missing {(~found).sum()} calendar days, "
+                    f"e.g. {self.dates[np.argmin(found)]:%Y-%m-%d}"
+                )
+        return values
+
+    def series(self, values: np.ndarray, name: str = None) -> pd.Series:
+        """Series of offset-aligned values, indexed by date"""
+        return pd.Series(values, index=self.dates, name=name)
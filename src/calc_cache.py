@@ -0,0 +1,182 @@
+"""
+Persistent cache of per-account NAV calculations
+
+Each account's calculation is keyed by a fingerprint (a blake2b digest) of
+everything it depends on: the calculated dates, the account's gross returns and
+cashflows, its initial NAV and expense ratio, and engine.ENGINE_VERSION. A run
+stores the accounts it calculated as one segment: a directory holding a
+(days x accounts) .npy array per value column and keys.npy, their
+fingerprints. Later runs read the columns of any account whose fingerprint
+matches and only calculate the rest.
+
+Segments are evicted least recently used first (by directory modification
+time, refreshed on every read) once the cache holds more than max_bytes. A
+segment larger than max_bytes on its own is not stored at all.
+"""
+import hashlib
+import logging
+import os
+import shutil
+import uuid
+from pathlib import Path
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.engine import ENGINE_VERSION, VALUE_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_BYTES = 1024**3
+KEY_DTYPE = "S16"
+
+
+def default_cache_dir() -> Path:
+    """
+    The user's cache directory for calc caches, apart from books and outputs
+
+    $XDG_CACHE_HOME/fund_accounting/calc, or ~/.cache/fund_accounting/calc.
+    Entries are keyed by their inputs, so books can share it.
+    """
+    cache_home = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(cache_home) / "fund_accounting" / "calc"
+
+
+class CalcCache:
+    """
+    On-disk cache of account values keyed by input fingerprint
+
+    :param cache_dir: directory holding the segments; created if missing
+    :param max_bytes: total size above which segments are evicted
+    """
+
+    def __init__(self, cache_dir: Path, max_bytes: int = DEFAULT_CACHE_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self._index = None
+
+    @staticmethod
+    def fingerprints(
+        dates: pd.DatetimeIndex,
+        gross_returns: np.ndarray,
+        cashflows: np.ndarray,
+        initial_nav: np.ndarray,
+        expense_ratio: np.ndarray,
+    ) -> np.ndarray:
+        """
+        Fingerprint of each account's inputs
+
+        :param gross_returns: (days x accounts) gross returns
+        :param cashflows: (days x accounts) cashflows
+        :return: one KEY_DTYPE digest per account
+        """
+        base = hashlib.blake2b(digest_size=16)
+        base.update(np.int64(ENGINE_VERSION).tobytes())
+        base.update(np.asarray(dates.asi8, dtype=np.int64).tobytes())
+        gross_returns = np.ascontiguousarray(np.asarray(gross_returns, dtype=float).T)
+        cashflows = np.ascontiguousarray(np.asarray(cashflows, dtype=float).T)
+        params = np.column_stack(
+            [
+                np.broadcast_to(np.asarray(initial_nav, dtype=float), len(cashflows)),
+                np.broadcast_to(np.asarray(expense_ratio, dtype=float), len(cashflows)),
+            ]
+        )
+        keys = np.empty(len(cashflows), dtype=KEY_DTYPE)
+        for account in range(len(cashflows)):
+            digest = base.copy()
+            digest.update(gross_returns[account].tobytes())
+            digest.update(cashflows[account].tobytes())
+            digest.update(params[account].tobytes())
+            keys[account] = digest.digest()
+        return keys
+
+    @property
+    def index(self) -> Dict[bytes, Tuple[Path, int]]:
+        """fingerprint -> (segment, column) of every cached account"""
+        if self._index is None:
+            self._index = {}
+            for keys_path in sorted(self.cache_dir.glob("segment-*/keys.npy")):
+                for col, key in enumerate(np.load(keys_path)):
+                    self._index[bytes(key)] = (keys_path.parent, col)
+        return self._index
+
+    def load(
+        self, keys: np.ndarray, n_days: int
+    ) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """
+        Read the cached accounts among `keys`
+
+        :return: mask of accounts found, and dict of VALUE_COLUMNS to
+        (n_days x accounts) arrays filled in for those accounts
+        """
+        values = {col: np.empty((n_days, len(keys))) for col in VALUE_COLUMNS}
+        found = np.zeros(len(keys), dtype=bool)
+        by_segment = {}
+        for account, key in enumerate(keys):
+            entry = self.index.get(bytes(key))
+            if entry is not None:
+                by_segment.setdefault(entry[0], []).append((account, entry[1]))
+        for segment, entries in by_segment.items():
+            accounts, cols = (np.array(idx) for idx in zip(*entries))
+            try:
+                cached = {
+                    col: np.load(segment / f"{col}.npy", mmap_mode="r")
+                    for col in VALUE_COLUMNS
+                }
+                os.utime(segment)
+            except FileNotFoundError:  # evicted by another process
+                continue
+            for col in VALUE_COLUMNS:
+                values[col][:, accounts] = cached[col][:, cols]
+            found[accounts] = True
+        return found, values
+
+    def store(self, keys: np.ndarray, values: Dict[str, np.ndarray]):
+        """Save newly calculated accounts as a segment, then evict if needed"""
+        if len(keys) == 0:
+            return
+        size = sum(values[col].nbytes for col in VALUE_COLUMNS)
+        if size > self.max_bytes:
+            logger.info(
+                "Not caching %s accounts: %s bytes exceed the calc cache's %s",
+                len(keys),
+                size,
+                self.max_bytes,
+            )
+            return
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        segment = self.cache_dir / f"segment-{uuid.uuid4().hex}"
+        # write into a temporary directory renamed into place, so readers only
+        # see whole segments
+        tmp_dir = self.cache_dir / f"tmp-{segment.name}"
+        tmp_dir.mkdir()
+        for col in VALUE_COLUMNS:
+            np.save(tmp_dir / f"{col}.npy", values[col])
+        np.save(tmp_dir / "keys.npy", np.asarray(keys, dtype=KEY_DTYPE))
+        os.replace(tmp_dir, segment)
+        for col, key in enumerate(keys):
+            self.index[bytes(key)] = (segment, col)
+        self.evict()
+
+    @staticmethod
+    def _segment_bytes(segment: Path) -> int:
+        try:
+            return sum(path.stat().st_size for path in segment.iterdir())
+        except FileNotFoundError:  # evicted by another process
+            return 0
+
+    def evict(self):
+        """Remove least recently used segments until within max_bytes"""
+        segments = sorted(
+            (path.stat().st_mtime, path) for path in self.cache_dir.glob("segment-*")
+        )
+        sizes = {path: self._segment_bytes(path) for _, path in segments}
+        total = sum(sizes.values())
+        for _, path in segments:
+            if total <= self.max_bytes:
+                break
+            total -= sizes[path]
+            logger.debug("Evicting %s from the calc cache", path.name)
+            shutil.rmtree(path, ignore_errors=True)
+            self._index = None
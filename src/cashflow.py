@@ -2,12 +2,63 @@
 Subscriptions and redemptions
 """
 import datetime
+from typing import Tuple
 
 import numpy as np
 import pandas as pd
 
+from src.business_calendar import BusinessCalendar
 from src.element import Element
 
+# upper bound on the (accounts x days) random draws held in memory at once
+SIMULATION_CHUNK_ELEMENTS = 2**22
+
+
+def simulate_cashflows(
+    n_days: int, turnover: np.ndarray, rng: np.random.Generator
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Draw cashflows for many accounts at once
+
+    turnover of 5, for our purposes, means a customer should have an abs val. of
+    cash flows of 5 x the initial investment over the life of the fund. This
+    conceals 2 parameters: p(cashflow) and proportion | cashflow (i.e. the
+    frequency and the magnitude of cashflows). Set an average cashflow of 50% of
+    assets, then a p-value such that sum(0.5*binomial draws) gets to the stated
+    turnover.
+
+    A binomial number of cashflow days chosen uniformly without replacement is
+    the same as an independent p-draw on every day, so the days for a block of
+    accounts come from one (accounts x days) uniform draw; blocks are bounded by
+    SIMULATION_CHUNK_ELEMENTS. Sizes are then drawn for all cashflows together.
+
+    :param n_days: number of business days
+    :param turnover: turnover for each account
+    :return: (account, day, amount) arrays for the non-zero cashflows, ordered
+    by account then day
+    """
+    turnover = np.asarray(turnover, dtype=float)
+    p_turnover = np.clip(2 * turnover / n_days, 0, 1)
+
+    chunk_size = max(1, SIMULATION_CHUNK_ELEMENTS // max(n_days, 1))
+    accounts, days = [], []
+    for start in range(0, len(turnover), chunk_size):
+        p_chunk = p_turnover[start : start + chunk_size, None]
+        chunk_accounts, chunk_days = np.nonzero(
+            rng.random((len(p_chunk), n_days)) < p_chunk
+        )
+        accounts.append(chunk_accounts + start)
+        days.append(chunk_days)
+    accounts = np.concatenate(accounts) if accounts else np.array([], dtype=int)
+    days = np.concatenate(days) if days else np.array([], dtype=int)
+
+    cashflow_sizes = rng.standard_normal(size=len(accounts))
+    scale = turnover * np.bincount(
+        accounts, weights=np.abs(cashflow_sizes), minlength=len(turnover)
+    )
+    cashflow_sizes /= scale[accounts]
+    return accounts, days, cashflow_sizes
+
 
 class CashFlow(Element):
     """
@@ -20,6 +71,15 @@ class CashFlow(Element):
     and a turnover preference.
     """
 
+    __slots__ = (
+        "_cashflow",
+        "_sparse",
+        "start_date",
+        "end_date",
+        "name",
+        "turnover_param",
+    )
+
     def __init__(
         self,
         cashflow: pd.Series,
@@ -38,13 +98,55 @@ class CashFlow(Element):
         simulation) as the simulation's use of this parameter is non-deterministic,
         it won't be calculated when cashflows are provided ahead
         """
-        self.cashflow = cashflow
+        self._cashflow = cashflow
+        self._sparse = None
         self.start_date = start_date
         self.end_date = end_date
         self.name = name
 
         self.turnover_param = turnover_param
 
+    @property
+    def cashflow(self) -> pd.Series:
+        """cashflow on every date, densified from sparse values if necessary"""
+        if self._cashflow is None:
+            days, amounts, index = self._sparse
+            values = np.zeros(len(index))
+            np.add.at(values, days, amounts)
+            return pd.Series(values, index=index, name=self.name)
+        return self._cashflow
+
+    @cashflow.setter
+    def cashflow(self, cashflow: pd.Series):
+        self._cashflow = cashflow
+        self._sparse = None
+
+    @classmethod
+    def from_sparse(
+        cls,
+        days: np.ndarray,
+        amounts: np.ndarray,
+        index: pd.DatetimeIndex,
+        name: str = None,
+    ):
+        """
+        Generate from non-zero cashflows only, as a view over the arrays given
+        (e.g. one account's rows of a BookRegistry); the dense series over
+        `index` is built each time `cashflow` is used, and not kept
+
+        :param days: position in `index` of each cashflow
+        :param amounts: amount of each cashflow
+        :param index: every date of the account, shared between accounts
+        """
+        cashflow = cls(
+            cashflow=None,
+            start_date=index[0],
+            end_date=index[-1],
+            name=name,
+        )
+        cashflow._sparse = (days, amounts, index)
+        return cashflow
+
     @classmethod
     def from_series(cls, cashflow: pd.Series):
         """Generate from an existing pandas Series object"""
@@ -62,38 +164,36 @@ class CashFlow(Element):
         end_date: datetime.date,
         turnover: float,
         name: str = None,
+        rng: np.random.Generator = None,
+        calendar: BusinessCalendar = None,
     ):
         """Generate cashflows according to customer turnover.
-        Note no association with fund performance has been included"""
+        Note no association with fund performance has been included
 
-        cashflow = pd.Series(index=pd.date_range(start_date, end_date, freq="B"))
-        n_days = cashflow.shape[0]
-
-        # turnover of 5, for our purposes,
-        # means a customer should have an abs val. of cash flows
-        # of 5 x the initial investment over the life of the fund
-        # this conceals 2 parameters: p(cashflow) and proportion | cashflow
-        # (i.e. the frequency and the magnitude of cashflows)
-        # Set an average cashflow of 50% of assets, then a p-value such that
-        # sum(0.5*binomial draws) gets to the stated turnover
-        p_turnover = 2 * turnover / n_days
-
-        n_cashflows = np.random.binomial(n_days, p_turnover)
-        cashflow_days = np.random.choice(n_days, n_cashflows, replace=False)
-
-        cashflow_sizes = np.random.standard_normal(size=n_cashflows)
-        cashflow_sizes /= turnover * sum(np.abs(cashflow_sizes))
+        :param rng: random generator; a fresh unseeded one if not given
+        :param calendar: days on which cashflows may fall; by default every
+        weekday from start_date to end_date
+        """
+        if rng is None:
+            rng = np.random.default_rng()
+        if calendar is None:
+            calendar = BusinessCalendar.from_range(start_date, end_date)
+        index = calendar.dates
+        _, cashflow_days, cashflow_sizes = simulate_cashflows(
+            len(index), np.array([turnover]), rng
+        )
 
-        values = np.zeros(n_days)
+        values = np.zeros(len(index))
         values[cashflow_days] = cashflow_sizes
 
-        cashflow = pd.Series(data=values, index=cashflow.index, name=name)
+        cashflow = pd.Series(data=values, index=index, name=name)
 
         return cls(
             cashflow=cashflow,
             start_date=start_date,
             end_date=end_date,
             turnover_param=turnover,
+            name=name,
         )
 
     def to_frame(self):
@@ -34,3 +34,7 @@ CUSTOMER_NAMES = [
     "Mitt",
     "Michael",
 ]
+
+# calculate-impact output formats; kept here, free of pandas, for main.py's
+# option parsing
+OUTPUT_FORMATS = ["csv", "parquet", "arrow"]
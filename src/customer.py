@@ -14,6 +14,8 @@ class Customer:
     :param turnover: what rough % of assets does this customer turnover per year?
     """
 
+    __slots__ = ("name", "turnover")
+
     name: str
     turnover: float
 
@@ -0,0 +1,254 @@
+"""
+Account value and impact calculation in DuckDB SQL over the parquet tables
+
+Each day's NAV update is an affine map of the previous NAV:
+
+  NAV_t = (NAV_t-1 * gross_return + cashflow) * (1 - expense_ratio)
+        = a_t * NAV_t-1 + b_t
+
+Affine maps compose associatively, (a2, b2) o (a1, b1) = (a2 * a1, a2 * b1 + b2),
+so every prefix of the recurrence is found with a log-depth (Hillis-Steele) scan:
+ceil(log2(days)) rounds, each joining every (account, day) with the running map
+2^k days earlier. Every round is a set-based join that DuckDB parallelizes and
+can spill to disk, unlike a recursive CTE, which steps one day at a time. Maps
+that underflow towards 0 just mean the distant past no longer matters, so the
+scan stays stable where a log-cumulative-sum of the products would not.
+
+Results match the pandas engine up to floating point rounding.
+"""
+import logging
+import math
+from pathlib import Path
+from typing import Tuple
+
+import duckdb
+import pandas as pd
+import pyarrow.parquet as pq
+
+from src.storage import table_parts
+
+logger = logging.getLogger(__name__)
+
+
+def _read_parquet(data_path: Path, name: str, numbered: bool = False) -> str:
+    """
+    SQL read_parquet() over every file of a table
+
+    :param numbered: add filename and file_row_number columns, by which rows
+    are ordered as the pandas engine reads them (parts are named in order)
+    """
+    paths = ", ".join(
+        "'" + str(path).replace("'", "''") + "'"
+        for path in table_parts(data_path, name)
+    )
+    if numbered:
+        return f"read_parquet([{paths}], filename=true, file_row_number=true)"
+    return f"read_parquet([{paths}])"
+
+
+def _date_column(data_path: Path) -> str:
+    """name of the date column of fund_returns (older books stored the index)"""
+    names = pq.read_schema(table_parts(data_path, "fund_returns")[0]).names
+    return "date" if "date" in names else "__index_level_0__"
+
+
+def _scan_sql(n_days: int) -> str:
+    """CTEs composing daily (a, b) maps into prefix maps, ending in scan_final"""
+    ctes = ["scan_0 AS (SELECT account_id, day, a, b FROM steps)"]
+    rounds = max(1, math.ceil(math.log2(max(n_days, 1))))
+    for k in range(rounds):
+        ctes.append(
+            f"""scan_{k + 1} AS (
+  SELECT cur.account_id, cur.day,
+    CASE WHEN prev.day IS NULL THEN cur.a ELSE cur.a * prev.a END AS a,
+    CASE WHEN prev.day IS NULL THEN cur.b ELSE cur.a * prev.b + cur.b END AS b
+  FROM scan_{k} cur
+  LEFT JOIN scan_{k} prev
+    ON prev.account_id = cur.account_id AND prev.day = cur.day - {2 ** k}
+)"""
+        )
+    ctes.append(f"scan_final AS (SELECT * FROM scan_{rounds})")
+    return ",\n".join(ctes)
+
+
+def _check_shareclasses(con: duckdb.DuckDBPyConnection):
+    """
+    Refuse accounts of shareclasses missing from the book, as the pandas
+    engine does, rather than leaving them out
+
+    :raises KeyError: if any account's shareclass is unknown
+    """
+    unknown, example = con.execute(
+        """
+SELECT count(*), min(account) FROM accounts WHERE expense_ratio IS NULL
+"""
+    ).fetchone()
+    if unknown:
+        raise KeyError(
+            f"{unknown} accounts reference unknown shareclasses, e.g. {example}"
+        )
+
+
+def _check_returns(con: duckdb.DuckDBPyConnection):
+    """
+    Refuse funds whose returns do not cover every date, as the pandas engine
+    does, rather than calculating NULL values from them
+
+    :raises ValueError: if a fund has no returns, or lacks any of the dates
+    """
+    gap = con.execute(
+        """
+SELECT
+  f.fund,
+  f.fund IN (SELECT fund FROM returns) AS loaded,
+  count(*) FILTER (WHERE r.returns IS NULL OR isnan(r.returns)) AS missing,
+  count(*) AS days
+FROM (SELECT DISTINCT fund FROM accounts) f
+CROSS JOIN dates d
+LEFT JOIN returns r ON r.fund = f.fund AND r.date = d.date
+GROUP BY f.fund
+HAVING missing > 0
+ORDER BY f.fund
+LIMIT 1
+"""
+    ).fetchone()
+    if gap is None:
+        return
+    fund, loaded, missing, days = gap
+    if not loaded:
+        raise ValueError(f"{fund} does not appear in loaded fund_returns")
+    raise ValueError(f"{fund} returns are missing {missing} of {days} days")
+
+
+def calc_accounts_duckdb(
+    data_path: Path, threads: int = None, memory_limit: str = None
+) -> Tuple[pd.DataFrame, pd.Series]:
+    """
+    Calculate account values and shareclass impact for a simulated book
+
+    :param threads: DuckDB worker threads; DuckDB's default if None
+    :param memory_limit: e.g. "4GB"; beyond it DuckDB spills to disk
+    :raises KeyError: if an account's shareclass is missing
+    :raises ValueError: if a fund's returns are missing any of the dates
+    :return: account values and impact, shaped like AccountingSystem.calc_accounts
+    and AccountingSystem.calc_impact
+    """
+    logger.info("Calculating accounts in DuckDB from %s", data_path)
+    data_path = Path(data_path)
+    config = {}
+    if threads is not None:
+        config["threads"] = threads
+    if memory_limit is not None:
+        config["memory_limit"] = memory_limit
+    con = duckdb.connect(config=config)
+
+    con.execute(
+        f"""
+CREATE TEMP TABLE accounts AS
+SELECT
+  a.account_id,
+  a.customer || '-' || a.fund || '_' || a.shareclass AS account,
+  a.customer, a.fund, a.shareclass,
+  a.initial_investment::DOUBLE AS initial_investment,
+  s.expense_ratio
+FROM (
+  SELECT
+    row_number() OVER (ORDER BY filename, file_row_number) AS account_id,
+    * EXCLUDE (filename, file_row_number)
+  FROM {_read_parquet(data_path, "accounts", numbered=True)}
+) a
+LEFT JOIN {_read_parquet(data_path, "shareclasses")} s
+  ON s.fund = a.fund AND s.name = a.shareclass;
+
+CREATE TEMP TABLE returns AS
+SELECT fund, "{_date_column(data_path)}" AS date, returns
+FROM {_read_parquet(data_path, "fund_returns")};
+
+CREATE TEMP TABLE cashflows AS
+SELECT account::VARCHAR AS account, date, sum(amount) AS amount
+FROM {_read_parquet(data_path, "cashflows")}
+GROUP BY ALL;
+
+CREATE TEMP TABLE dates AS
+SELECT date, row_number() OVER (ORDER BY date) AS day
+FROM (SELECT date FROM returns UNION SELECT date FROM cashflows);
+
+CREATE TEMP TABLE inputs AS
+SELECT
+  a.account_id, d.day, d.date,
+  r.returns AS gross_return,
+  coalesce(c.amount, 0.0) AS cashflow
+FROM accounts a
+CROSS JOIN dates d
+LEFT JOIN returns r ON r.fund = a.fund AND r.date = d.date
+LEFT JOIN cashflows c ON c.account = a.account AND c.date = d.date;
+"""
+    )
+    (n_days,) = con.execute("SELECT count(*) FROM dates").fetchone()
+    _check_shareclasses(con)
+    _check_returns(con)
+
+    con.execute(
+        f"""
+CREATE TEMP TABLE account_values AS
+WITH steps AS (
+  SELECT
+    i.account_id, i.day,
+    i.gross_return * (1 - a.expense_ratio) AS a,
+    i.cashflow * (1 - a.expense_ratio) AS b
+  FROM inputs i JOIN accounts a USING (account_id)
+),
+{_scan_sql(n_days)},
+navs AS (
+  SELECT s.account_id, s.day, s.a * a.initial_investment + s.b AS nav
+  FROM scan_final s JOIN accounts a USING (account_id)
+),
+values AS (
+  SELECT
+    i.account_id, i.day, i.date, i.gross_return, i.cashflow,
+    coalesce(
+      lag(n.nav) OVER (PARTITION BY i.account_id ORDER BY i.day),
+      a.initial_investment
+    ) * i.gross_return AS init_GAV,
+    a.expense_ratio
+  FROM inputs i
+  JOIN navs n USING (account_id, day)
+  JOIN accounts a USING (account_id)
+)
+SELECT
+  v.date, v.gross_return, v.cashflow, v.init_GAV,
+  v.init_GAV + v.cashflow AS GAV,
+  (v.init_GAV + v.cashflow) * v.expense_ratio AS expense,
+  (v.init_GAV + v.cashflow) - (v.init_GAV + v.cashflow) * v.expense_ratio AS NAV,
+  v.account_id, v.day, a.account, a.customer, a.fund, a.shareclass
+FROM values v JOIN accounts a USING (account_id)
+"""
+    )
+    account_values = con.execute(
+        """
+SELECT * EXCLUDE (account_id, day) FROM account_values ORDER BY account_id, day
+"""
+    ).df()
+
+    impact = con.execute(
+        """
+WITH totals AS (
+  SELECT customer, fund, shareclass, sum(expense) AS expense
+  FROM account_values
+  GROUP BY ALL
+)
+SELECT
+  customer, fund, shareclass,
+  expense - lag(expense) OVER (PARTITION BY customer, fund ORDER BY shareclass)
+    AS expense
+FROM totals
+ORDER BY customer, fund, shareclass
+"""
+    ).df()
+    con.close()
+
+    account_values = account_values.set_index("date")
+    for col in ["account", "customer", "fund", "shareclass"]:
+        account_values[col] = account_values[col].astype("category")
+    impact = impact.set_index(["customer", "fund", "shareclass"]).expense
+    return account_values, impact
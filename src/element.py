@@ -1,8 +1,12 @@
 """
-Base class for accounting elements
+Base class for accounting elements, and a lazily-built mapping of them
 """
 
 import abc
+from collections.abc import Mapping
+from typing import Any, Callable, Iterable, Iterator
+
+import pandas as pd
 
 
 class Element(abc.ABC):
@@ -10,6 +14,35 @@ class Element(abc.ABC):
     base class for accounting elements
     """
 
+    __slots__ = ()
+
     @abc.abstractmethod
     def to_frame(self):
         """Output as a dataframe row"""
+
+
+class LazyElements(Mapping):
+    """
+    Read-only mapping of name -> element, building each element on first access
+
+    :param keys: the element names
+    :param factory: builds the element for a name
+    """
+
+    def __init__(self, keys: Iterable[str], factory: Callable[[str], Any]):
+        self.keys_index = pd.Index(keys)
+        self.factory = factory
+        self._built = {}
+
+    def __getitem__(self, key: str):
+        if key not in self._built:
+            if key not in self.keys_index:
+                raise KeyError(key)
+            self._built[key] = self.factory(key)
+        return self._built[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys_index)
+
+    def __len__(self) -> int:
+        return len(self.keys_index)
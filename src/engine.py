@@ -0,0 +1,86 @@
+"""
+Array-based NAV / expense calculation shared by the accounting classes
+
+The calculation for one trading day is:
+
+  a. init_GAV = previous NAV * gross return
+  b. GAV = init_GAV + cashflow
+  c. expense = GAV * expense ratio
+  d. NAV = GAV - expense
+
+Each day depends on the previous day's NAV, so the recurrence is sequential in
+time. It is vectorized across everything else: ``gross_returns`` and
+``cashflows`` have days on the leading axis, and any trailing axes (accounts,
+expense ratios, scenarios...) are broadcast together and advanced one day at a
+time with numpy ufuncs writing into preallocated float64 arrays.
+"""
+from typing import Dict
+
+import numpy as np
+
+VALUE_COLUMNS = ["init_GAV", "GAV", "expense", "NAV"]
+
+# part of every calc cache fingerprint; bump when calculate_nav's results change
+ENGINE_VERSION = 1
+
+
+def _broadcast_days(values: np.ndarray, tail: tuple) -> np.ndarray:
+    """broadcast (days, ...) to (days, *tail), aligning the trailing axes right"""
+    n_missing = len(tail) - (values.ndim - 1)
+    values = values.reshape(values.shape[:1] + (1,) * n_missing + values.shape[1:])
+    return np.broadcast_to(values, values.shape[:1] + tail)
+
+
+def calculate_nav(
+    gross_returns: np.ndarray,
+    cashflows: np.ndarray,
+    initial_investment,
+    expense_ratio,
+) -> Dict[str, np.ndarray]:
+    """
+    Run the NAV recurrence over float64 arrays
+
+    :param gross_returns: gross return per day, shape (days, ...)
+    :param cashflows: cashflow per day, shape (days, ...)
+    :param initial_investment: NAV before the first day, broadcast against the
+    trailing axes
+    :param expense_ratio: shareclass expense ratio, broadcast against the
+    trailing axes
+    :return: dict of VALUE_COLUMNS to arrays of shape (days, *trailing axes)
+    """
+    gross_returns = np.asarray(gross_returns, dtype=np.float64)
+    cashflows = np.asarray(cashflows, dtype=np.float64)
+    initial_investment = np.asarray(initial_investment, dtype=np.float64)
+    expense_ratio = np.asarray(expense_ratio, dtype=np.float64)
+    if gross_returns.ndim == 0 or cashflows.ndim == 0:
+        raise ValueError("gross_returns and cashflows need a leading days axis")
+    if gross_returns.shape[0] != cashflows.shape[0]:
+        raise ValueError(
+            f"gross_returns has {gross_returns.shape[0]} days "
+            f"but cashflows has {cashflows.shape[0]}"
+        )
+
+    n_days = gross_returns.shape[0]
+    tail = np.broadcast_shapes(
+        gross_returns.shape[1:],
+        cashflows.shape[1:],
+        initial_investment.shape,
+        expense_ratio.shape,
+    )
+    gross_returns = _broadcast_days(gross_returns, tail)
+    cashflows = _broadcast_days(cashflows, tail)
+
+    values = {col: np.empty((n_days,) + tail) for col in VALUE_COLUMNS}
+    init_gav, gav, expense, nav_out = (values[col] for col in VALUE_COLUMNS)
+
+    nav = np.broadcast_to(initial_investment, tail)
+    for day in range(n_days):
+        # index with an Ellipsis so single-account rows stay writable 0-d views
+        row = (day, Ellipsis)
+        np.multiply(nav, gross_returns[row], out=init_gav[row])
+        np.add(init_gav[row], cashflows[row], out=gav[row])
+        np.multiply(gav[row], expense_ratio, out=expense[row])
+        np.subtract(gav[row], expense[row], out=nav_out[row])
+        nav = nav_out[row]
+
+    return values
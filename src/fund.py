@@ -8,6 +8,7 @@ from typing import Callable, List
 import pandas as pd
 import numpy as np
 
+from src.business_calendar import BusinessCalendar
 from src.element import Element
 
 
@@ -46,20 +47,56 @@ class Fund(Element):
         out["return_generator"] = out["return_generator"].__name__
         return pd.Series(out)
 
-    def simulate_performance(self) -> pd.DataFrame:
-        """generate gross returns according to provided parameters"""
-        frame = pd.DataFrame(
-            index=pd.date_range(self.start_date, self.end_date, freq="B")
-        )
+    def simulate_performance(
+        self, rng: np.random.Generator = None, calendar: BusinessCalendar = None
+    ) -> pd.DataFrame:
+        """
+        generate gross returns according to provided parameters
+
+        :param rng: draw from this generator's method of the same name as
+        return_generator rather than from the global numpy random state
+        :param calendar: days on which to draw returns; by default every weekday
+        from start_date to end_date
+        """
+        generator = self.return_generator
+        if rng is not None:
+            generator = getattr(rng, generator.__name__)
+        if calendar is None:
+            calendar = BusinessCalendar.from_range(self.start_date, self.end_date)
+        frame = pd.DataFrame(index=calendar.dates)
         frame["fund"] = self.name
-        frame["returns"] = self.return_generator(*self.return_params, size=frame.shape)
+        frame["returns"] = generator(*self.return_params, size=frame.shape)
         return frame
 
+    def simulate_scenarios(
+        self,
+        n_scenarios: int,
+        rng: np.random.Generator = None,
+        calendar: BusinessCalendar = None,
+    ) -> np.ndarray:
+        """
+        generate many gross return paths in one draw
+
+        :param rng: draw from this generator's method of the same name as
+        return_generator; a fresh unseeded generator if not given
+        :param calendar: days of each path; by default every weekday from
+        start_date to end_date
+        :return: (scenarios x days) gross returns
+        """
+        if rng is None:
+            rng = np.random.default_rng()
+        if calendar is None:
+            calendar = BusinessCalendar.from_range(self.start_date, self.end_date)
+        generator = getattr(rng, self.return_generator.__name__)
+        return generator(*self.return_params, size=(n_scenarios, len(calendar)))
+
 
 @dataclass
 class FundShareClass(Element):
     """A shareclass of an investable fund"""
 
+    __slots__ = ("name", "fund", "expense_ratio")
+
     name: str
     fund: Fund  # fk to Fund name
     expense_ratio: float
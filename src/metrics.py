@@ -0,0 +1,147 @@
+"""
+Timing of pipeline stages, and rate limiting of hot-path log messages
+
+A Profiler records, per stage (load, calc, impact, write...), wall time, rows
+and accounts processed, accounts per second and the peak resident set size of
+the process and its workers so far, and writes them as a JSON report.
+"""
+import json
+import logging
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+
+def peak_rss_mb() -> Dict[str, float]:
+    """peak resident set size of this process and of its finished workers, in MB"""
+    if resource is None:
+        return {"self": None, "children": None}
+    # ru_maxrss is in kilobytes on Linux, bytes on macOS
+    scale = 2**20 if sys.platform == "darwin" else 2**10
+    return {
+        who: resource.getrusage(flag).ru_maxrss / scale
+        for who, flag in [
+            ("self", resource.RUSAGE_SELF),
+            ("children", resource.RUSAGE_CHILDREN),
+        ]
+    }
+
+
+class Stage:
+    """
+    Measurements of one stage
+
+    :param name: stage name
+    :param rows: rows processed, if known; may be set inside the stage
+    :param accounts: accounts processed, if known; may be set inside the stage
+    """
+
+    __slots__ = ("name", "rows", "accounts", "seconds", "peak_rss_mb")
+
+    def __init__(self, name: str, rows: int = None, accounts: int = None):
+        self.name = name
+        self.rows = rows
+        self.accounts = accounts
+        self.seconds = None
+        self.peak_rss_mb = None
+
+    def to_dict(self) -> Dict:
+        """JSON-able measurements, with throughput where counts are known"""
+        accounts_per_sec = None
+        if self.accounts is not None and self.seconds:
+            accounts_per_sec = self.accounts / self.seconds
+        return {
+            "stage": self.name,
+            "seconds": self.seconds,
+            "rows": self.rows,
+            "accounts": self.accounts,
+            "accounts_per_sec": accounts_per_sec,
+            "peak_rss_mb": self.peak_rss_mb,
+        }
+
+
+class Profiler:
+    """
+    Per-stage wall time, rows and peak RSS of a run
+
+    A disabled profiler still times stages (logged at DEBUG) but keeps
+    nothing, so commands can use one unconditionally.
+
+    :param enabled: record stages for report()
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.stages: List[Stage] = []
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str, rows: int = None, accounts: int = None):
+        """
+        Measure the enclosed block as a stage
+
+        Counts not known up front can be set on the yielded Stage.
+        """
+        stage = Stage(name, rows, accounts)
+        start = time.perf_counter()
+        try:
+            yield stage
+        finally:
+            stage.seconds = time.perf_counter() - start
+            stage.peak_rss_mb = peak_rss_mb()
+            logger.debug("%s took %.3fs for %s rows", name, stage.seconds, stage.rows)
+            if self.enabled:
+                self.stages.append(stage)
+
+    def report(self) -> Dict:
+        """all stages measured so far, plus the run's total wall time"""
+        return {
+            "total_seconds": time.perf_counter() - self._start,
+            "peak_rss_mb": peak_rss_mb(),
+            "stages": [stage.to_dict() for stage in self.stages],
+        }
+
+    def write(self, path: Path):
+        """Save report() as JSON"""
+        with open(path, "w") as report_file:
+            json.dump(self.report(), report_file, indent=2)
+        logger.info("Wrote profile to %s", path)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Let through at most one record per call site every `interval` seconds
+
+    Suppressed records are counted, and the next record let through from the
+    same call site notes how many there were.
+
+    :param interval: seconds between records from one call site
+    """
+
+    def __init__(self, interval: float = 1.0):
+        super().__init__()
+        self.interval = interval
+        self._last = {}
+        self._suppressed = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        site = (record.pathname, record.lineno)
+        now = time.monotonic()
+        last = self._last.get(site)
+        if last is not None and now - last < self.interval:
+            self._suppressed[site] = self._suppressed.get(site, 0) + 1
+            return False
+        self._last[site] = now
+        suppressed = self._suppressed.pop(site, 0)
+        if suppressed:
+            record.msg = f"{record.msg} ({suppressed} similar messages suppressed)"
+        return True
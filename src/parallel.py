@@ -0,0 +1,136 @@
+"""
+Multi-process execution of the NAV recurrence
+
+Accounts are partitioned by fund and each fund's accounts are calculated in a
+worker process. Inputs and outputs live in memory-mapped .npy files in a
+temporary directory: workers receive only that directory and column indices,
+map the inputs read-only and write their own columns of the outputs. Every
+column is computed exactly as it would be in a single process, so the merged
+result does not depend on the number of workers.
+
+map_over_memmaps is the general form, also used for scenario batches.
+"""
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from src.engine import VALUE_COLUMNS, calculate_nav
+
+
+def _call_mapped(
+    func: Callable,
+    tmp_dir: str,
+    inputs: List[str],
+    outputs: List[str],
+    args: Tuple,
+):
+    """worker: call func on the arrays memory-mapped from tmp_dir"""
+    tmp_dir = Path(tmp_dir)
+    arrays = {name: np.load(tmp_dir / f"{name}.npy", mmap_mode="r") for name in inputs}
+    arrays.update(
+        {name: np.load(tmp_dir / f"{name}.npy", mmap_mode="r+") for name in outputs}
+    )
+    result = func(arrays, *args)
+    for name in outputs:
+        arrays[name].flush()
+    return result
+
+
+def map_over_memmaps(
+    func: Callable,
+    inputs: Dict[str, np.ndarray],
+    tasks: Sequence[Tuple],
+    workers: int,
+    outputs: Dict[str, Tuple[int, ...]] = None,
+) -> Tuple[List, Dict[str, np.ndarray]]:
+    """
+    Spill arrays to .npy files and call func(arrays, *task) for each task in a
+    process pool
+
+    Workers receive only the temporary directory and their task, and map the
+    inputs read-only; outputs are mapped writable, for tasks to fill in
+    disjoint parts of.
+
+    :param func: picklable (module-level) function of a dict of the named
+    arrays and a task's arguments
+    :param inputs: arrays to share, by name; saved in their memory order
+    :param tasks: arguments of each call
+    :param workers: number of worker processes
+    :param outputs: shapes of zero-filled, column-major float arrays to share
+    :return: each task's result, in order, and the outputs, read into memory
+    """
+    outputs = outputs or {}
+    with tempfile.TemporaryDirectory(prefix="fund_accounting_") as tmp_dir:
+        tmp_path = Path(tmp_dir)
+        for name, array in inputs.items():
+            np.save(tmp_path / f"{name}.npy", array)
+        for name, shape in outputs.items():
+            np.lib.format.open_memmap(
+                tmp_path / f"{name}.npy", mode="w+", shape=shape, fortran_order=True
+            ).flush()
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(
+                    _call_mapped, func, tmp_dir, list(inputs), list(outputs), task
+                )
+                for task in tasks
+            ]
+            results = [future.result() for future in futures]
+
+        return results, {name: np.load(tmp_path / f"{name}.npy") for name in outputs}
+
+
+def _calc_fund(arrays: Dict[str, np.ndarray], fund_col: int, account_cols: np.ndarray):
+    """worker: calculate the accounts of one fund into the shared outputs"""
+    params = arrays["params"]
+    values = calculate_nav(
+        arrays["fund_returns"][:, [fund_col]],
+        arrays["cashflows"][:, account_cols],
+        initial_investment=params[0, account_cols],
+        expense_ratio=params[1, account_cols],
+    )
+    for col in VALUE_COLUMNS:
+        arrays[col][:, account_cols] = values[col]
+
+
+def calculate_nav_by_fund(
+    fund_returns: np.ndarray,
+    fund_idx: np.ndarray,
+    cashflows: np.ndarray,
+    initial_investment: np.ndarray,
+    expense_ratio: np.ndarray,
+    workers: int,
+) -> Dict[str, np.ndarray]:
+    """
+    calculate_nav for (days x accounts) inputs across a process pool
+
+    :param fund_returns: (days x funds) gross returns
+    :param fund_idx: column of fund_returns for each account
+    :param cashflows: (days x accounts) cashflows
+    :param initial_investment: per-account initial investment
+    :param expense_ratio: per-account expense ratio
+    :param workers: number of worker processes
+    :return: dict of VALUE_COLUMNS to (days x accounts) arrays
+    """
+    fund_idx = np.asarray(fund_idx)
+    shape = np.shape(cashflows)
+    _, values = map_over_memmaps(
+        _calc_fund,
+        {
+            "fund_returns": np.asarray(fund_returns, dtype=float),
+            # column-major so that each account's history is contiguous on disk
+            "cashflows": np.asfortranarray(cashflows, dtype=float),
+            "params": np.vstack([initial_investment, expense_ratio]).astype(float),
+        },
+        [
+            (fund_col, np.flatnonzero(fund_idx == fund_col))
+            for fund_col in np.unique(fund_idx)
+        ],
+        workers,
+        outputs={col: shape for col in VALUE_COLUMNS},
+    )
+    return values
@@ -0,0 +1,164 @@
+"""
+Struct-of-arrays store of a book's customers, shareclasses, accounts and cashflows
+
+Everything is numbered with integer ids (positions in the name indexes), and
+per-row attributes live in one numpy array per column, so an account costs a
+few dozen bytes rather than a handful of Python objects. Cashflows of all
+accounts are held in compressed sparse row form: account i's cashflows are
+rows cashflow_offsets[i]:cashflow_offsets[i + 1] of cashflow_days, positions in
+the shared `dates` calendar, and cashflow_amounts.
+
+Customer, FundShareClass, CashFlow and Account objects are built on demand as
+light views over these arrays (see AccountingSystem.from_tables).
+"""
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.account import account_names
+
+
+class BookRegistry:
+    """
+    Integer-keyed arrays describing a book
+
+    :param dates: the shared calendar that cashflow days index into
+    :param customers: customer names; customer id = position
+    :param turnover: turnover per customer id
+    :param shareclasses: "fund_name" shareclass keys; shareclass id = position
+    :param shareclass_fund: fund name per shareclass id
+    :param shareclass_name: shareclass name (without fund) per shareclass id
+    :param expense_ratio: expense ratio per shareclass id
+    :param accounts: account names; account id = position
+    :param account_customer: customer id per account id
+    :param account_shareclass: shareclass id per account id
+    :param initial_investment: initial investment per account id
+    :param cashflow_offsets: start of each account's cashflow rows, with the
+    total number of rows appended
+    :param cashflow_days: position in `dates` of each cashflow
+    :param cashflow_amounts: amount of each cashflow
+    """
+
+    __slots__ = (
+        "dates",
+        "customers",
+        "turnover",
+        "shareclasses",
+        "shareclass_fund",
+        "shareclass_name",
+        "expense_ratio",
+        "accounts",
+        "account_customer",
+        "account_shareclass",
+        "initial_investment",
+        "cashflow_offsets",
+        "cashflow_days",
+        "cashflow_amounts",
+    )
+
+    def __init__(self, **arrays):
+        for name in self.__slots__:
+            setattr(self, name, arrays[name])
+
+    @classmethod
+    def from_tables(cls, tables: Dict[str, pd.DataFrame]) -> "BookRegistry":
+        """
+        Number and join the simulated tables
+
+        :param tables: frames keyed like storage.TABLE_NAMES, with at least the
+        LOAD_COLUMNS of each, and long-format cashflows as from read_cashflows
+        :raises KeyError: for accounts of unknown customers or shareclasses
+        """
+        customer_df = tables["customers"]
+        customers = pd.Index(customer_df["name"].to_numpy(dtype=object))
+
+        shareclass_df = tables["shareclasses"]
+        shareclass_fund = shareclass_df["fund"].to_numpy(dtype=object)
+        shareclass_name = shareclass_df["name"].to_numpy(dtype=object)
+        shareclasses = pd.Index(shareclass_fund + "_" + shareclass_name)
+
+        account_df = tables["accounts"]
+        accounts = pd.Index(
+            account_names(
+                account_df.customer, account_df.fund, account_df.shareclass
+            ).to_numpy(dtype=object)
+        )
+        account_customer = customers.get_indexer(account_df.customer)
+        account_shareclass = shareclasses.get_indexer(
+            account_df.fund.to_numpy(dtype=object)
+            + "_"
+            + account_df.shareclass.to_numpy(dtype=object)
+        )
+        unknown = (account_customer < 0) | (account_shareclass < 0)
+        if unknown.any():
+            raise KeyError(
+                f"{unknown.sum()} accounts reference unknown customers or "
+                f"shareclasses, e.g. {accounts[unknown][0]}"
+            )
+
+        cashflow_df = tables["cashflows"]
+        dates = (
+            pd.DatetimeIndex(tables["fund_returns"].index.unique())
+            .union(pd.DatetimeIndex(cashflow_df.date.unique()))
+            .rename("date")
+        )
+        offsets, days, amounts = cls._cashflow_rows(accounts, dates, cashflow_df)
+
+        return cls(
+            dates=dates,
+            customers=customers,
+            turnover=customer_df["turnover"].to_numpy(dtype=float),
+            shareclasses=shareclasses,
+            shareclass_fund=shareclass_fund,
+            shareclass_name=shareclass_name,
+            expense_ratio=shareclass_df["expense_ratio"].to_numpy(dtype=float),
+            accounts=accounts,
+            account_customer=account_customer.astype(np.int32),
+            account_shareclass=account_shareclass.astype(np.int32),
+            initial_investment=account_df["initial_investment"].to_numpy(dtype=float),
+            cashflow_offsets=offsets,
+            cashflow_days=days,
+            cashflow_amounts=amounts,
+        )
+
+    @staticmethod
+    def _cashflow_rows(
+        accounts: pd.Index, dates: pd.DatetimeIndex, cashflow_df: pd.DataFrame
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """cashflow rows of known accounts, grouped by account id (CSR form)"""
+        account_idx = accounts.get_indexer(cashflow_df.account)
+        days = dates.get_indexer(cashflow_df.date).astype(np.int32)
+        amounts = cashflow_df.amount.to_numpy(dtype=float)
+        keep = account_idx >= 0
+        if not keep.all():
+            account_idx, days, amounts = account_idx[keep], days[keep], amounts[keep]
+        if (np.diff(account_idx) < 0).any():
+            order = np.argsort(account_idx, kind="stable")
+            account_idx, days, amounts = account_idx[order], days[order], amounts[order]
+        offsets = np.zeros(len(accounts) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(account_idx, minlength=len(accounts)), out=offsets[1:])
+        return offsets, days, amounts
+
+    def cashflow_rows(self, account_id: int) -> slice:
+        """rows of cashflow_days and cashflow_amounts holding an account's cashflows"""
+        return slice(
+            self.cashflow_offsets[account_id], self.cashflow_offsets[account_id + 1]
+        )
+
+    def account_table(self) -> pd.DataFrame:
+        """
+        One row per account, indexed by account name, with customer, fund,
+        shareclass, initial_investment and expense_ratio columns
+        """
+        shareclass = self.account_shareclass
+        return pd.DataFrame(
+            {
+                "customer": self.customers.to_numpy()[self.account_customer],
+                "fund": self.shareclass_fund[shareclass],
+                "shareclass": self.shareclass_name[shareclass],
+                "initial_investment": self.initial_investment,
+                "expense_ratio": self.expense_ratio[shareclass],
+            },
+            index=self.accounts,
+        )
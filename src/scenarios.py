@@ -0,0 +1,141 @@
+"""
+Monte Carlo scenarios of fund returns, and account expenses under them
+
+Each batch of scenarios draws (scenarios x days) return paths for every fund in
+one call per fund, then runs the NAV recurrence for every account in every
+scenario of the batch at once, on (days x accounts x scenarios) arrays. Only
+the total expense of each account in each scenario is kept, so memory is
+bounded by the batch size rather than by the number of scenarios.
+
+Batches draw from generators spawned from SeedSequence(seed), one per batch,
+so results depend on the seed and batch size but not on the number of worker
+processes.
+"""
+import logging
+from typing import Dict, List
+
+import numpy as np
+
+from src.business_calendar import BusinessCalendar
+from src.engine import calculate_nav
+from src.fund import Fund
+from src.parallel import map_over_memmaps
+
+logger = logging.getLogger(__name__)
+
+SCENARIO_BATCH_SIZE = 64
+
+
+def scenario_expenses(
+    funds: List[Fund],
+    fund_idx: np.ndarray,
+    calendar: BusinessCalendar,
+    cashflows: np.ndarray,
+    initial_investment: np.ndarray,
+    expense_ratio: np.ndarray,
+    n_scenarios: int,
+    seed: np.random.SeedSequence,
+) -> np.ndarray:
+    """
+    Total expense of every account in each of a batch of return scenarios
+
+    :param funds: the funds whose returns are simulated
+    :param fund_idx: position in `funds` of each account's fund
+    :param cashflows: (days x accounts) cashflows, shared by every scenario
+    :return: (accounts x scenarios) total expenses
+    """
+    rng = np.random.default_rng(seed)
+    # (funds x scenarios x days) -> (days x accounts x scenarios)
+    returns = np.stack(
+        [fund.simulate_scenarios(n_scenarios, rng, calendar) for fund in funds]
+    )
+    gross = returns.transpose(2, 0, 1)[:, fund_idx, :]
+    values = calculate_nav(
+        gross,
+        np.asarray(cashflows)[:, :, None],
+        np.asarray(initial_investment)[:, None],
+        np.asarray(expense_ratio)[:, None],
+    )
+    return values["expense"].sum(axis=0)
+
+
+def _scenario_batch(
+    arrays: Dict[str, np.ndarray],
+    funds: List[Fund],
+    calendar: BusinessCalendar,
+    n_scenarios: int,
+    seed: np.random.SeedSequence,
+) -> np.ndarray:
+    """worker: scenario_expenses over memory-mapped inputs"""
+    params = arrays["params"]
+    return scenario_expenses(
+        funds,
+        np.asarray(arrays["fund_idx"]),
+        calendar,
+        arrays["cashflows"],
+        params[0],
+        params[1],
+        n_scenarios,
+        seed,
+    )
+
+
+def calculate_scenario_expenses(
+    funds: List[Fund],
+    fund_idx: np.ndarray,
+    calendar: BusinessCalendar,
+    cashflows: np.ndarray,
+    initial_investment: np.ndarray,
+    expense_ratio: np.ndarray,
+    n_scenarios: int,
+    seed: int = None,
+    batch_size: int = SCENARIO_BATCH_SIZE,
+    workers: int = 1,
+) -> np.ndarray:
+    """
+    scenario_expenses for n_scenarios, in batches of at most batch_size
+
+    :param seed: seed for the scenarios; fresh entropy if None
+    :param workers: number of processes across which to run the batches
+    :return: (accounts x n_scenarios) total expenses
+    """
+    starts = range(0, n_scenarios, batch_size)
+    sizes = [min(batch_size, n_scenarios - start) for start in starts]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    logger.info(
+        "Simulating %s scenarios in %s batches of up to %s",
+        n_scenarios,
+        len(sizes),
+        batch_size,
+    )
+    if workers <= 1 or len(sizes) <= 1:
+        batches = [
+            scenario_expenses(
+                funds,
+                fund_idx,
+                calendar,
+                cashflows,
+                initial_investment,
+                expense_ratio,
+                size,
+                batch_seed,
+            )
+            for size, batch_seed in zip(sizes, seeds)
+        ]
+    else:
+        batches, _ = map_over_memmaps(
+            _scenario_batch,
+            {
+                "cashflows": np.asarray(cashflows, dtype=float),
+                "fund_idx": np.asarray(fund_idx),
+                "params": np.stack([initial_investment, expense_ratio]).astype(float),
+            },
+            [
+                (funds, calendar, size, batch_seed)
+                for size, batch_seed in zip(sizes, seeds)
+            ],
+            workers,
+        )
+    if not batches:
+        return np.empty((len(expense_ratio), 0))
+    return np.concatenate(batches, axis=1)
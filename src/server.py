@@ -0,0 +1,238 @@
+"""
+Local HTTP service answering impact and account-value queries from a warm book
+
+A WarmBook loads a simulated book once, calculates every account and keeps
+the results in memory, so queries only filter frames already calculated.
+Before each query the book's parquet files are stat'ed; tables whose files
+changed (by modification time or size) are re-read, the others are kept, and
+the accounts are recalculated. With a CalcCache, only accounts whose inputs
+changed are calculated again.
+
+Endpoints (GET, JSON responses):
+
+  /impact?customer=Jim&fund=spx,tech
+  /account_values?customer=Jim&start=2022-01-01&end=2022-03-31
+  /health
+
+customer, fund and shareclass take comma-separated names and may be repeated;
+start and end bound the dates, inclusive.
+"""
+import json
+import logging
+import threading
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pandas as pd
+
+from src.accounting_system import LOAD_COLUMNS, AccountingSystem
+from src.calc_cache import CalcCache
+from src.storage import TABLE_NAMES, read_tables, table_parts
+
+logger = logging.getLogger(__name__)
+
+LABELS = ["customer", "fund", "shareclass"]
+
+
+class BookSnapshot(NamedTuple):
+    """one calculation of a book, replaced whole so queries never mix two"""
+
+    system: AccountingSystem
+    account_values: pd.DataFrame
+    impact: pd.Series
+
+
+class WarmBook:
+    """
+    A book's AccountingSystem, account values and impact, kept in memory
+
+    :param data_path: path to data simulated by Simulator
+    :param workers: number of processes across which to calculate accounts
+    :param cache: reuse unchanged accounts' values when recalculating
+    """
+
+    def __init__(self, data_path: Path, workers: int = 1, cache: CalcCache = None):
+        self.data_path = Path(data_path)
+        self.workers = workers
+        self.cache = cache
+        self.tables: Dict[str, pd.DataFrame] = {}
+        self.stamps: Dict[str, Tuple] = {}
+        self.snapshot: BookSnapshot = None
+        self._lock = threading.Lock()
+        self.refresh()
+
+    @property
+    def system(self) -> AccountingSystem:
+        """the latest snapshot's AccountingSystem"""
+        return self.snapshot.system
+
+    def _stamp(self, name: str) -> Tuple:
+        """(path, mtime, size) of each file of a table"""
+        stamp = []
+        for path in table_parts(self.data_path, name):
+            stat = path.stat()
+            stamp.append((str(path), stat.st_mtime_ns, stat.st_size))
+        return tuple(stamp)
+
+    def refresh(self) -> List[str]:
+        """
+        Re-read the tables whose files changed and recalculate if any did
+
+        If that fails, the previous snapshot is kept and the next refresh
+        tries again.
+
+        :return: names of the tables re-read
+        """
+        with self._lock:
+            stamps = {name: self._stamp(name) for name in TABLE_NAMES}
+            changed = [
+                name for name in TABLE_NAMES if self.stamps.get(name) != stamps[name]
+            ]
+            if changed:
+                logger.info("Loading %s from %s", ", ".join(changed), self.data_path)
+                tables = {
+                    **self.tables,
+                    **read_tables(
+                        self.data_path,
+                        {name: LOAD_COLUMNS.get(name) for name in changed},
+                    ),
+                }
+                system = AccountingSystem.from_tables(self.data_path, dict(tables))
+                account_values = system.calc_accounts(
+                    workers=self.workers, cache=self.cache
+                )
+                impact = system.calc_impact(account_values)
+                # kept only once calculated, so a failed reload is retried;
+                # published in one assignment, as queries read it unlocked
+                self.tables, self.stamps = tables, stamps
+                self.snapshot = BookSnapshot(system, account_values, impact)
+            return changed
+
+    def query_impact(
+        self,
+        customers: List[str] = None,
+        funds: List[str] = None,
+        shareclasses: List[str] = None,
+    ) -> pd.Series:
+        """impact of the selected customers, funds and shareclasses"""
+        impact = self.snapshot.impact
+        mask = _label_mask(
+            impact.index.get_level_values, customers, funds, shareclasses
+        )
+        return impact if mask is None else impact[mask]
+
+    def query_account_values(
+        self,
+        customers: List[str] = None,
+        funds: List[str] = None,
+        shareclasses: List[str] = None,
+        start: str = None,
+        end: str = None,
+    ) -> pd.DataFrame:
+        """account values of the selected accounts, from start to end inclusive"""
+        values = self.snapshot.account_values
+        mask = _label_mask(values.__getitem__, customers, funds, shareclasses)
+        if start is not None or end is not None:
+            dates = values.index
+            in_range = np.ones(len(dates), dtype=bool)
+            if start is not None:
+                in_range &= dates >= pd.Timestamp(start)
+            if end is not None:
+                in_range &= dates <= pd.Timestamp(end)
+            mask = in_range if mask is None else mask & in_range
+        return values if mask is None else values[mask]
+
+
+def _label_mask(get_labels, customers, funds, shareclasses):
+    """rows whose customer, fund and shareclass are among those given, or None"""
+    mask = None
+    for label, selected in zip(LABELS, [customers, funds, shareclasses]):
+        if selected:
+            matches = pd.Index(get_labels(label)).isin(selected)
+            mask = matches if mask is None else mask & matches
+    return mask
+
+
+class BookRequestHandler(BaseHTTPRequestHandler):
+    """Serve queries against the server's WarmBook"""
+
+    server: "BookServer"
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = parse_qs(url.query)
+
+        def names(key: str) -> List[str]:
+            return [name for value in params.get(key, []) for name in value.split(",")]
+
+        def single(key: str) -> str:
+            return params[key][-1] if key in params else None
+
+        book = self.server.book
+        if url.path == "/health":
+            self._send(HTTPStatus.OK, {"data_path": str(book.data_path)})
+            return
+        if url.path not in ("/impact", "/account_values"):
+            self._send(HTTPStatus.NOT_FOUND, {"error": f"unknown path {url.path}"})
+            return
+        # a book that fails to reload is the server's fault, not the request's
+        try:
+            book.refresh()
+        except Exception as err:
+            logger.exception("Failed to reload %s", book.data_path)
+            self._send(
+                HTTPStatus.INTERNAL_SERVER_ERROR,
+                {"error": f"failed to reload the book: {err!r}"},
+            )
+            return
+        try:
+            labels = dict(
+                customers=names("customer"),
+                funds=names("fund"),
+                shareclasses=names("shareclass"),
+            )
+            if url.path == "/impact":
+                result = book.query_impact(**labels).rename("impact").reset_index()
+            else:
+                result = book.query_account_values(
+                    **labels, start=single("start"), end=single("end")
+                ).reset_index()
+        except ValueError as err:
+            self._send(HTTPStatus.BAD_REQUEST, {"error": str(err)})
+            return
+        except Exception as err:  # keep serving, and answer rather than hang up
+            logger.exception("Failed to answer %s", self.path)
+            self._send(HTTPStatus.INTERNAL_SERVER_ERROR, {"error": repr(err)})
+            return
+        self._send(HTTPStatus.OK, result.to_json(orient="records", date_format="iso"))
+
+    def _send(self, status: HTTPStatus, body):
+        """respond with body, JSON-encoded unless already a JSON string"""
+        payload = (body if isinstance(body, str) else json.dumps(body)).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+
+class BookServer(ThreadingHTTPServer):
+    """
+    HTTP server over a WarmBook
+
+    :param address: (host, port) to listen on; port 0 picks a free port
+    :param book: the warm book to query
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], book: WarmBook):
+        super().__init__(address, BookRequestHandler)
+        self.book = book
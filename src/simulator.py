@@ -4,19 +4,20 @@ Container for configuration & simulation of the fund accounting system
 import datetime
 import json
 import logging
-import random
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import asdict, dataclass, field
 from pathlib import Path
-from typing import List
+from typing import Dict, List
 
 import numpy as np
 import pandas as pd
 
-from src.account import Account
-from src.cashflow import CashFlow
+from src.account import account_names
+from src.business_calendar import BusinessCalendar
+from src.cashflow import simulate_cashflows
 from src.constants import CUSTOMER_NAMES, FUND_NAMES, SHARECLASS_NAMES
-from src.customer import Customer
 from src.fund import Fund, FundShareClass
+from src.storage import CASHFLOW_PARQUET_OPTIONS, IO_THREADS, write_tables
 
 logger = logging.getLogger(__name__)
 
@@ -25,6 +26,13 @@ logger = logging.getLogger(__name__)
 class Simulator:
     """
     Parameters for simulation of funds
+
+    :param seed: seed for all random draws; the same config and seed reproduce
+    the same data. If None, fresh entropy is drawn and logged.
+    :param customers_per_shard: if set, generate customers in shards of this
+    size, each written as its own part files
+    :param holidays: name of a pandas.tseries.holiday calendar, e.g.
+    "USFederalHolidayCalendar", whose holidays are not trading days
     """
 
     start_date: datetime.date
@@ -36,6 +44,9 @@ class Simulator:
     expense_ratios: List = field(
         default_factory=lambda: np.linspace(0.95, 1, num=50, endpoint=False)
     )
+    seed: int = None
+    customers_per_shard: int = None
+    holidays: str = None
 
     @classmethod
     def from_json(cls, json_path: Path):
@@ -69,12 +80,42 @@ class Simulator:
             columns=los[0].to_frame().index,
         )
 
-    def simulate(self, out_path: Path = None, **kwargs):
-        """Simulate fund accounting data using parameters"""
+    @property
+    def calendar(self) -> BusinessCalendar:
+        """trading days shared by fund returns and cashflows"""
+        return BusinessCalendar.from_range(
+            self.start_date, self.end_date, self.holidays
+        )
+
+    @property
+    def num_shards(self) -> int:
+        """number of customer shards the book is generated in"""
+        if self.customers_per_shard is None:
+            return 1
+        return max(1, -(-self.num_customers // self.customers_per_shard))
+
+    def simulate(self, out_path: Path = None, workers: int = 1, **kwargs):
+        """
+        Simulate fund accounting data using parameters
+
+        Every draw comes from numpy Generators spawned from SeedSequence(seed):
+        one for the funds, shareclasses and fund returns, and one per shard of
+        customers. Customers, accounts and cashflows are drawn as arrays for a
+        whole shard rather than object by object. The output therefore depends
+        on the config (including customers_per_shard) but not on `workers`.
+
+        When the book is sharded, customers, accounts and cashflows are written
+        as customers/part-0000.parquet, etc., one part per shard.
+
+        :param workers: number of processes across which to generate shards
+        """
         if out_path is None:
             out_path = Path(f"data/f{datetime.datetime.now():%Y%m%d.%H%M}")
 
-        logger.info("Generating fake data")
+        seed = np.random.SeedSequence(self.seed)
+        logger.info("Generating fake data with seed %s", seed.entropy)
+        book_seed, *shard_seeds = seed.spawn(self.num_shards + 1)
+        rng = np.random.default_rng(book_seed)
 
         # Funds
         funds = [
@@ -85,75 +126,153 @@ class Simulator:
                 **kwargs,
             )
             for fund_name in np.asarray(FUND_NAMES).take(
-                np.random.choice(len(FUND_NAMES), self.num_funds, replace=False)
+                rng.choice(len(FUND_NAMES), self.num_funds, replace=False)
             )
         ]
 
         ## Share classes
-        shareclasses = []
-        for fund in funds:
-            for i in range(self.num_shareclasses):
-                shareclasses.append(
-                    FundShareClass(
-                        name=SHARECLASS_NAMES[i],
-                        fund=fund,
-                        expense_ratio=random.choice(self.expense_ratios),
-                    ),
-                )
+        expense_ratios = rng.choice(
+            self.expense_ratios, size=self.num_funds * self.num_shareclasses
+        )
+        shareclasses = [
+            FundShareClass(
+                name=SHARECLASS_NAMES[i % self.num_shareclasses],
+                fund=funds[i // self.num_shareclasses],
+                expense_ratio=expense_ratio,
+            )
+            for i, expense_ratio in enumerate(expense_ratios)
+        ]
+        shareclass_df = self._series_to_frame(shareclasses)
 
         ## gross performance at fund level
-        performances = pd.concat([fund.simulate_performance() for fund in funds])
+        calendar = self.calendar
+        performances = pd.concat(
+            [fund.simulate_performance(rng, calendar) for fund in funds]
+        )
+
+        # dump to parquet
+        logger.info("Writing data to %s", out_path)
+        out_path.mkdir(parents=True, exist_ok=True)
+        write_tables(
+            {
+                "funds": self._series_to_frame(funds),
+                "shareclasses": shareclass_df,
+                "fund_returns": performances,
+            },
+            out_path,
+        )
+
+        # Customers, accounts and cashflows, shard by shard
+        shards = [
+            (self, shareclass_df, shard, shard_seed, out_path)
+            for shard, shard_seed in enumerate(shard_seeds)
+        ]
+        if workers > 1 and len(shards) > 1:
+            # the workers already write in parallel; one writer thread each
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [
+                    pool.submit(_simulate_shard, *args, io_threads=1) for args in shards
+                ]
+                for future in futures:
+                    future.result()
+        else:
+            for args in shards:
+                _simulate_shard(*args)
+
+    def simulate_customers(
+        self,
+        rng: np.random.Generator,
+        shareclass_df: pd.DataFrame,
+        first_customer: int,
+        num_customers: int,
+    ) -> Dict[str, pd.DataFrame]:
+        """
+        Simulate customers, their accounts in every shareclass, and cashflows
 
+        :param first_customer: number of the first customer, used in names
+        :return: customers, accounts and cashflows frames
+        """
         # Customers
         ## name, etc.
-        customers = {
-            f"{name}_{i}": Customer(name=f"{name}_{i}", turnover=turnover)
-            for i, (name, turnover) in enumerate(
-                zip(
-                    np.asarray(CUSTOMER_NAMES).take(
-                        np.random.choice(len(CUSTOMER_NAMES), self.num_customers)
-                    ),
-                    np.abs(
-                        np.random.normal(self.avg_turnover, size=self.num_customers)
-                    ),
-                )
-            )
-        }
+        customer_df = pd.DataFrame(
+            {
+                "name": [
+                    f"{name}_{i}"
+                    for i, name in enumerate(
+                        np.asarray(CUSTOMER_NAMES).take(
+                            rng.choice(len(CUSTOMER_NAMES), num_customers)
+                        ),
+                        start=first_customer,
+                    )
+                ],
+                "turnover": np.abs(rng.normal(self.avg_turnover, size=num_customers)),
+            }
+        )
 
         ## investments
         # make one account per customer per shareclass
         # also make cash flows
-        accounts = []
-        cashflows = []
-        for customer in customers.values():
-            for shareclass in shareclasses:
-                cashflows.append(
-                    CashFlow.from_parameters(
-                        start_date=self.start_date,
-                        end_date=self.end_date,
-                        turnover=customer.turnover,
-                        name=f"{customer}-{shareclass}",
-                    )
-                )
-                accounts.append(
-                    Account(
-                        customer=customer,
-                        shareclass=shareclass,
-                        cashflows=cashflows[-1],
-                        initial_investment=np.random.randint(10, 1000) * 1000,
-                    )
-                )
+        customer_idx = np.repeat(np.arange(len(customer_df)), len(shareclass_df))
+        shareclass_idx = np.tile(np.arange(len(shareclass_df)), len(customer_df))
+        account_df = pd.DataFrame(
+            {
+                "customer": customer_df["name"].to_numpy()[customer_idx],
+                "fund": shareclass_df["fund"].to_numpy()[shareclass_idx],
+                "shareclass": shareclass_df["name"].to_numpy()[shareclass_idx],
+                "initial_investment": rng.integers(10, 1000, size=len(customer_idx))
+                * 1000,
+            }
+        )
 
-        # dump to parquet
-        logger.info("Writing data to %s", out_path)
-        out_path.mkdir(parents=True, exist_ok=True)
-        self._series_to_frame(funds).to_parquet(out_path / "funds.parquet")
-        self._series_to_frame(shareclasses).to_parquet(
-            out_path / "shareclasses.parquet"
+        dates = self.calendar.dates
+        cashflow_accounts, cashflow_days, cashflow_sizes = simulate_cashflows(
+            len(dates), customer_df["turnover"].to_numpy()[customer_idx], rng
         )
-        performances.to_parquet(out_path / "fund_returns.parquet")
-        self._series_to_frame(list(customers.values())).to_parquet(
-            out_path / "customers.parquet"
+        cashflow_df = pd.DataFrame(
+            {
+                "account": pd.Categorical.from_codes(
+                    cashflow_accounts,
+                    categories=account_names(
+                        account_df.customer, account_df.fund, account_df.shareclass
+                    ),
+                ),
+                "date": dates[cashflow_days],
+                "amount": cashflow_sizes,
+            }
         )
-        self._series_to_frame(accounts).to_parquet(out_path / "accounts.parquet")
-        self._series_to_frame(cashflows).T.to_parquet(out_path / "cashflows.parquet")
+        return {
+            "customers": customer_df,
+            "accounts": account_df,
+            "cashflows": cashflow_df,
+        }
+
+
+def _simulate_shard(
+    sim: Simulator,
+    shareclass_df: pd.DataFrame,
+    shard: int,
+    seed: np.random.SeedSequence,
+    out_path: Path,
+    io_threads: int = IO_THREADS,
+):
+    """
+    generate and write one shard of customers (run in worker processes)
+
+    :param io_threads: threads writing the shard's tables at once
+    """
+    if sim.customers_per_shard is None:
+        first_customer, num_customers, part = 0, sim.num_customers, None
+    else:
+        first_customer = shard * sim.customers_per_shard
+        num_customers = min(sim.customers_per_shard, sim.num_customers - first_customer)
+        part = shard
+    tables = sim.simulate_customers(
+        np.random.default_rng(seed), shareclass_df, first_customer, num_customers
+    )
+    write_tables(
+        tables,
+        out_path,
+        part=part,
+        options={"cashflows": CASHFLOW_PARQUET_OPTIONS},
+        threads=io_threads,
+    )
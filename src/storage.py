@@ -0,0 +1,333 @@
+"""
+Reading and writing the parquet tables that make up a simulated book
+
+A table is either a single file, e.g. customers.parquet, or a directory of part
+files, e.g. customers/part-0000.parquet, as written by a sharded simulation.
+
+Files are read memory-mapped, and several tables (or the parts of one) are read
+or written concurrently on a thread pool: pyarrow releases the GIL while
+reading, decoding and encoding, so a book loads in about the time of its
+largest file rather than the sum of them all.
+"""
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+
+from src.constants import OUTPUT_FORMATS
+
+TABLE_NAMES = [
+    "funds",
+    "shareclasses",
+    "fund_returns",
+    "customers",
+    "accounts",
+    "cashflows",
+]
+
+# cashflows are long-format (account, date, amount) rows of non-zero cashflows,
+# ordered by account then date, with the account names dictionary-encoded; row
+# groups then cover contiguous runs of accounts for filtered reads
+CASHFLOW_COLUMNS = ["account", "date", "amount"]
+CASHFLOW_PARQUET_OPTIONS = dict(
+    compression="zstd",
+    use_dictionary=["account"],
+    row_group_size=256 * 1024,
+)
+
+# threads reading or writing files at once
+IO_THREADS = 8
+
+# parquet and arrow output (see constants.OUTPUT_FORMATS) write account values
+# as a dataset partitioned by fund, zstd-compressed, with the label columns
+# dictionary-encoded, so DuckDB/dbt can read them without re-parsing text
+LABEL_COLUMNS = ["account", "customer", "fund", "shareclass"]
+DATASET_FORMATS = ["parquet", "arrow"]
+
+
+def table_path(data_path: Path, name: str) -> Path:
+    """location of a single-file table within a data directory"""
+    return Path(data_path) / f"{name}.parquet"
+
+
+def part_path(data_path: Path, name: str, part: int) -> Path:
+    """location of one part of a partitioned table"""
+    return Path(data_path) / name / f"part-{part:04d}.parquet"
+
+
+def table_parts(data_path: Path, name: str) -> List[Path]:
+    """the file(s) holding a table, in part order"""
+    part_dir = Path(data_path) / name
+    if part_dir.is_dir():
+        return sorted(part_dir.glob("part-*.parquet"))
+    return [table_path(data_path, name)]
+
+
+def write_table(
+    frame: pd.DataFrame, data_path: Path, name: str, part: int = None, **options
+):
+    """
+    Write a table, or one part of it if `part` is given
+
+    :param options: passed on to pyarrow.parquet.write_table
+    """
+    if part is None:
+        path = table_path(data_path, name)
+    else:
+        path = part_path(data_path, name, part)
+        path.parent.mkdir(parents=True, exist_ok=True)
+    frame.to_parquet(path, **options)
+
+
+def write_tables(
+    tables: Dict[str, pd.DataFrame],
+    data_path: Path,
+    part: int = None,
+    options: Dict[str, Dict] = None,
+    threads: int = IO_THREADS,
+):
+    """
+    Write several tables (or one part of each) concurrently
+
+    :param options: write_table options, keyed by table name
+    :param threads: tables written at once; 1 in worker processes that
+    already write in parallel with each other
+    """
+    options = options or {}
+    with ThreadPoolExecutor(threads) as pool:
+        futures = [
+            pool.submit(
+                write_table, frame, data_path, name, part, **options.get(name, {})
+            )
+            for name, frame in tables.items()
+        ]
+        for future in futures:
+            future.result()
+
+
+def read_table(
+    data_path: Path, name: str, columns: List[str] = None, filters: List = None
+) -> pd.DataFrame:
+    """
+    Read one table, projecting to the requested columns
+
+    :param columns: columns to read; None reads everything. Index columns stored
+    in the pandas metadata are restored either way.
+    :param filters: pyarrow filters on rows, e.g. [("fund", "in", ["spx"])]
+    """
+    parts = table_parts(data_path, name)
+
+    def read_part(path: Path) -> pd.DataFrame:
+        return pd.read_parquet(path, columns=columns, filters=filters, memory_map=True)
+
+    if len(parts) == 1:
+        return read_part(parts[0])
+    with ThreadPoolExecutor(IO_THREADS) as pool:
+        return pd.concat(list(pool.map(read_part, parts)), ignore_index=True)
+
+
+def read_tables(
+    data_path: Path,
+    columns: Dict[str, List[str]],
+    filters: Dict[str, List] = None,
+) -> Dict[str, pd.DataFrame]:
+    """
+    Read several tables concurrently
+
+    :param columns: columns to read, keyed by table name. cashflows is read
+    with read_cashflows, whatever its columns.
+    :param filters: pyarrow row filters, keyed by table name
+    """
+    filters = filters or {}
+    with ThreadPoolExecutor(IO_THREADS) as pool:
+        futures = {
+            name: (
+                pool.submit(read_cashflows, data_path, filters=filters.get(name))
+                if name == "cashflows"
+                else pool.submit(
+                    read_table,
+                    data_path,
+                    name,
+                    columns=table_columns,
+                    filters=filters.get(name),
+                )
+            )
+            for name, table_columns in columns.items()
+        }
+        return {name: future.result() for name, future in futures.items()}
+
+
+def read_cashflows(
+    data_path: Path, accounts: List[str] = None, filters: List = None
+) -> pd.DataFrame:
+    """
+    Read long-format cashflows, optionally only those of the named accounts
+
+    Books written before cashflows were long-format hold a dense (date x account)
+    table instead; that is read with column projection and converted.
+
+    :param filters: further pyarrow row filters, e.g. on date
+    :return: frame of CASHFLOW_COLUMNS with a categorical account column
+    """
+    if accounts is not None and len(accounts) == 0:
+        # pyarrow cannot type an empty "in" value set
+        return pd.DataFrame(
+            {
+                "account": pd.Categorical([]),
+                "date": pd.DatetimeIndex([], dtype="datetime64[us]"),
+                "amount": np.array([], dtype=float),
+            }
+        )
+    parts = table_parts(data_path, "cashflows")
+    if "account" not in pq.read_schema(parts[0]).names:
+        wide = read_table(data_path, "cashflows", columns=accounts, filters=filters)
+        day_idx, account_idx = np.nonzero(wide.to_numpy() != 0)
+        cashflows = pd.DataFrame(
+            {
+                "account": pd.Categorical.from_codes(
+                    account_idx, categories=wide.columns
+                ),
+                "date": wide.index[day_idx],
+                "amount": wide.to_numpy()[day_idx, account_idx],
+            }
+        )
+        return cashflows.sort_values(["account", "date"], ignore_index=True)
+
+    if accounts is not None:
+        filters = [("account", "in", list(accounts)), *(filters or [])]
+    cashflows = read_table(
+        data_path, "cashflows", columns=CASHFLOW_COLUMNS, filters=filters
+    )
+    cashflows["account"] = cashflows["account"].astype("category")
+    return cashflows
+
+
+def read_checkpoint(out_path: Path) -> pd.DataFrame:
+    """incremental-run checkpoint saved in an output directory, or None"""
+    path = Path(out_path) / "checkpoint.parquet"
+    if not path.exists():
+        return None
+    return pd.read_parquet(path)
+
+
+def write_checkpoint(checkpoint: pd.DataFrame, out_path: Path):
+    """save an incremental-run checkpoint to an output directory"""
+    checkpoint.to_parquet(Path(out_path) / "checkpoint.parquet")
+
+
+def iter_table_batches(
+    data_path: Path, name: str, batch_size: int, columns: List[str] = None
+) -> Iterator[pd.DataFrame]:
+    """Read one table as consecutive frames of at most batch_size rows"""
+    for path in table_parts(data_path, name):
+        parquet_file = pq.ParquetFile(path)
+        for batch in parquet_file.iter_batches(batch_size=batch_size, columns=columns):
+            yield batch.to_pandas()
+
+
+def _dataset_format(output_format: str) -> Tuple[ds.FileFormat, str]:
+    """pyarrow dataset file format, with zstd write options, and file suffix"""
+    if output_format == "parquet":
+        return ds.ParquetFileFormat(), "parquet"
+    if output_format == "arrow":
+        return ds.IpcFileFormat(), "arrow"
+    raise ValueError(f"{output_format} is not one of {DATASET_FORMATS}")
+
+
+def _label_categories(frame: pd.DataFrame) -> pd.DataFrame:
+    """label columns as categoricals, which arrow writes dictionary-encoded"""
+    return frame.astype(
+        {col: "category" for col in LABEL_COLUMNS if col in frame.columns}
+    )
+
+
+def write_dataset_part(
+    frame: pd.DataFrame,
+    dataset_path: Path,
+    part: int,
+    partition_cols: List[str],
+    output_format: str = "parquet",
+):
+    """
+    Append a frame to a hive-partitioned parquet or arrow dataset as part `part`
+
+    Files are named part-{part:05d}-{i}.<format> within each partition, so parts
+    written in order can be read back in order.
+    """
+    file_format, suffix = _dataset_format(output_format)
+    ds.write_dataset(
+        pa.Table.from_pandas(_label_categories(frame)),
+        dataset_path,
+        format=file_format,
+        file_options=file_format.make_write_options(compression="zstd"),
+        partitioning=partition_cols,
+        partitioning_flavor="hive",
+        basename_template=f"part-{part:05d}-{{i}}.{suffix}",
+        existing_data_behavior="overwrite_or_ignore",
+    )
+
+
+def next_dataset_part(dataset_path: Path) -> int:
+    """part number following the highest one already in a dataset"""
+    parts = [
+        int(path.name.split("-")[1]) for path in Path(dataset_path).rglob("part-*")
+    ]
+    return max(parts, default=-1) + 1
+
+
+def write_account_values(
+    account_values: pd.DataFrame,
+    out_path: Path,
+    output_format: str = "csv",
+    append: bool = False,
+):
+    """
+    Write calculate-impact's daily account values to an output directory
+
+    csv writes account_values.csv; parquet and arrow write an account_values/
+    dataset partitioned by fund.
+
+    :param append: add to the values already written (e.g. by the previous
+    incremental run) instead of replacing them
+    """
+    # checked before replacing, so that a bad call keeps the previous output
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"{output_format} is not one of {OUTPUT_FORMATS}")
+    out_path = Path(out_path)
+    if output_format == "csv":
+        path = out_path / "account_values.csv"
+        append = append and path.exists()
+        account_values.to_csv(path, mode="a" if append else "w", header=not append)
+        return
+    dataset_path = out_path / "account_values"
+    if append:
+        part = next_dataset_part(dataset_path)
+    else:
+        part = 0
+        if dataset_path.exists():
+            shutil.rmtree(dataset_path)
+    write_dataset_part(
+        account_values, dataset_path, part, ["fund"], output_format=output_format
+    )
+
+
+def write_impact(impact: pd.Series, out_path: Path, output_format: str = "csv"):
+    """Write calculate-impact's shareclass impact as impact.<format>"""
+    out_path = Path(out_path)
+    if output_format == "csv":
+        impact.to_csv(out_path / "impact.csv")
+        return
+    table = pa.Table.from_pandas(_label_categories(impact.reset_index()))
+    if output_format == "parquet":
+        pq.write_table(table, out_path / "impact.parquet", compression="zstd")
+    elif output_format == "arrow":
+        feather.write_feather(table, out_path / "impact.arrow", compression="zstd")
+    else:
+        raise ValueError(f"{output_format} is not one of {OUTPUT_FORMATS}")
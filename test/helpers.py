@@ -0,0 +1,64 @@
+"""
+Fixtures shared by the test modules
+"""
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from src.account import Account
+from src.accounting_system import AccountingSystem
+from src.cashflow import CashFlow
+from src.customer import Customer
+from src.fund import Fund, FundShareClass
+
+
+def make_system(num_funds=2, num_shareclasses=2, num_customers=3):
+    """small in-memory accounting system, the same on every call"""
+    rng = np.random.default_rng(42)
+    start_date = datetime.date(2021, 1, 1)
+    end_date = datetime.date(2021, 6, 30)
+    funds = {
+        name: Fund(name=name, start_date=start_date, end_date=end_date)
+        for name in ["spx", "tech", "value"][:num_funds]
+    }
+    shareclasses = {
+        f"{fund.name}_{name}": FundShareClass(
+            name=name, fund=fund, expense_ratio=0.001 * (i + 1)
+        )
+        for fund in funds.values()
+        for i, name in enumerate("ABC"[:num_shareclasses])
+    }
+    customers = {
+        f"cust_{i}": Customer(name=f"cust_{i}", turnover=1)
+        for i in range(num_customers)
+    }
+    accounts = {}
+    cashflows = {}
+    for customer in customers.values():
+        for shareclass in shareclasses.values():
+            name = f"{customer}-{shareclass}"
+            cashflow = CashFlow.from_parameters(
+                start_date, end_date, turnover=1, rng=rng
+            )
+            cashflow.cashflow.name = name
+            cashflows[name] = cashflow
+            accounts[name] = Account(
+                customer=customer,
+                shareclass=shareclass,
+                cashflows=cashflow,
+                initial_investment=rng.integers(10, 1000) * 1000,
+            )
+    fund_returns = pd.concat(
+        [fund.simulate_performance(rng) for fund in funds.values()]
+    )
+    fund_returns["returns"] += 1
+    return AccountingSystem(
+        data_path=None,
+        cashflows=cashflows,
+        customers=customers,
+        fund_returns=fund_returns,
+        funds=funds,
+        accounts=accounts,
+        shareclasses=shareclasses,
+    )
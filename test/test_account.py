@@ -0,0 +1,101 @@
+"""
+Tests for account value calculation
+"""
+import datetime
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from src.account import Account
+from src.business_calendar import BusinessCalendar
+from src.cashflow import CashFlow
+from src.customer import Customer
+from src.engine import calculate_nav
+from src.fund import Fund, FundShareClass
+
+
+def loop_values(account: Account, gross_returns: pd.Series) -> pd.DataFrame:
+    """reference implementation: the per-day iterrows loop calculate_values replaced"""
+    values = pd.DataFrame(
+        {"gross_return": gross_returns, "cashflow": account.cashflows.cashflow}
+    )
+    values = pd.concat(
+        [
+            values,
+            pd.DataFrame(
+                index=values.index,
+                columns=["init_GAV", "GAV", "expense", "NAV"],
+                dtype=float,
+            ),
+        ],
+        axis=1,
+    )
+    prev_nav = account.initial_investment
+    for bday, row in values.iterrows():
+        values.loc[bday, "init_GAV"] = prev_nav * row["gross_return"]
+        values.loc[bday, "GAV"] = values.loc[bday, "init_GAV"] + row["cashflow"]
+        values.loc[bday, "expense"] = (
+            values.loc[bday, "GAV"] * account.shareclass.expense_ratio
+        )
+        values.loc[bday, "NAV"] = values.loc[bday, "GAV"] - values.loc[bday, "expense"]
+        prev_nav = values.loc[bday, "NAV"]
+    return values
+
+
+class TestAccount(unittest.TestCase):
+    """tests for Account.calculate_values"""
+
+    def setUp(self):
+        np.random.seed(1234)
+        start_date = datetime.date(2020, 1, 1)
+        end_date = datetime.date(2020, 12, 31)
+        fund = Fund(name="spx", start_date=start_date, end_date=end_date)
+        self.shareclass = FundShareClass(name="A", fund=fund, expense_ratio=0.01)
+        self.account = Account(
+            customer=Customer(name="Jim_0", turnover=1),
+            shareclass=self.shareclass,
+            cashflows=CashFlow.from_parameters(start_date, end_date, turnover=2),
+            initial_investment=250_000,
+        )
+        # keep the path away from 0 so the comparison is meaningful
+        self.gross_returns = 1 + fund.simulate_performance().returns
+
+    def test_matches_loop(self):
+        """vectorized values equal the per-day loop"""
+        expected = loop_values(self.account, self.gross_returns)
+        actual = self.account.calculate_values(self.gross_returns)
+        self.assertEqual(list(actual.columns), list(expected.columns))
+        pd.testing.assert_index_equal(actual.index, expected.index)
+        np.testing.assert_array_equal(actual.to_numpy(), expected.to_numpy())
+
+    def test_shared_calendar(self):
+        """days of a shared calendar without cashflows calculate as none"""
+        cashflow = self.account.cashflows.cashflow
+        expected = self.account.calculate_values(self.gross_returns)
+        same = BusinessCalendar(cashflow.index)
+        pd.testing.assert_frame_equal(
+            self.account.calculate_values(self.gross_returns, same), expected
+        )
+
+        extra_day = cashflow.index[0] - pd.Timedelta(days=1)
+        gross_returns = pd.concat(
+            [pd.Series([1.0], index=[extra_day]), self.gross_returns]
+        )
+        calendar = BusinessCalendar(cashflow.index.insert(0, extra_day))
+        actual = self.account.calculate_values(gross_returns, calendar)
+        pd.testing.assert_index_equal(actual.index, calendar.dates)
+        self.assertEqual(actual.cashflow.iloc[0], 0.0)
+        np.testing.assert_array_equal(actual.cashflow.iloc[1:], cashflow)
+
+    def test_broadcast_accounts(self):
+        """2-D inputs compute each column as an independent account"""
+        returns = self.gross_returns.to_numpy()
+        cashflows = self.account.cashflows.cashflow.to_numpy()
+        ratios = np.array([0.0, 0.01, 0.02])
+        batch = calculate_nav(returns, cashflows[:, None], 250_000, ratios)
+        self.assertEqual(batch["NAV"].shape, (len(returns), 3))
+        for i, ratio in enumerate(ratios):
+            single = calculate_nav(returns, cashflows, 250_000, ratio)
+            np.testing.assert_array_equal(batch["NAV"][:, i], single["NAV"])
+        np.testing.assert_array_equal(batch["NAV"][:, 0], batch["GAV"][:, 0])
@@ -0,0 +1,365 @@
+"""
+Tests for the accounting system
+"""
+import datetime
+import pathlib
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+from click.testing import CliRunner
+
+from main import cli
+from src.accounting_system import AccountingSystem, NoMatchingAccountsError
+from src.simulator import Simulator
+from src.storage import read_cashflows
+from test.helpers import make_system
+
+
+class TestAccountingSystem(unittest.TestCase):
+    """tests for AccountingSystem"""
+
+    def setUp(self):
+        self.system = make_system()
+
+    def test_batched_matches_per_account(self):
+        """one (days x accounts) pass gives the per-account results"""
+        expected = self.system.calc_accounts(batched=False)
+        actual = self.system.calc_accounts(batched=True)
+        for col in ["account", "customer", "fund", "shareclass"]:
+            self.assertIsInstance(actual[col].dtype, pd.CategoricalDtype)
+            actual[col] = actual[col].astype(object)
+            expected[col] = expected[col].astype(object)
+        pd.testing.assert_frame_equal(actual, expected, check_freq=False)
+
+    def test_impact(self):
+        """impact is the same whichever way the accounts were calculated"""
+        expected = self.system.calc_impact(self.system.calc_accounts(batched=False))
+        actual = self.system.calc_impact(self.system.calc_accounts(batched=True))
+        np.testing.assert_array_equal(actual.to_numpy(), expected.to_numpy())
+        self.assertEqual(len(actual), 3 * 2 * 2)
+
+    def test_returns_for_fund(self):
+        """indexed lookup gives the same series as filtering the long table"""
+        returns = self.system.fund_returns
+        for fund_name in ["spx", "tech"]:
+            pd.testing.assert_series_equal(
+                self.system.returns_for_fund(fund_name),
+                returns[returns.fund == fund_name].returns,
+            )
+        with self.assertRaisesRegex(ValueError, "junkbond does not appear"):
+            self.system.returns_for_fund("junkbond")
+
+    def test_missing_fund(self):
+        """accounts in a fund without returns raise"""
+        self.system.fund_returns = self.system.fund_returns[
+            self.system.fund_returns.fund != "tech"
+        ]
+        for batched in [True, False]:
+            with self.assertRaisesRegex(ValueError, "tech does not appear"):
+                self.system.calc_accounts(batched=batched)
+
+    def test_what_if(self):
+        """each account is priced under its fund's shareclass ratios"""
+        what_if = self.system.what_if()
+        self.assertEqual(
+            list(what_if.index.names),
+            ["customer", "fund", "shareclass", "expense_ratio"],
+        )
+        # 3 customers x 2 funds x 2 shareclasses, each under 2 candidates
+        self.assertEqual(len(what_if), 3 * 2 * 2 * 2)
+
+        # the candidate equal to an account's own ratio reproduces its expenses
+        accounts = self.system.account_table
+        totals = self.system.total_expenses(self.system.calc_accounts())
+        own = what_if.reset_index("expense_ratio")
+        own = own[
+            own.expense_ratio
+            == accounts.set_index(
+                ["customer", "fund", "shareclass"]
+            ).expense_ratio.reindex(own.index)
+        ]
+        np.testing.assert_allclose(own.expense, totals.reindex(own.index), rtol=1e-12)
+        np.testing.assert_array_equal(own.impact, 0.0)
+
+        # other candidates match recalculating the account with that ratio
+        account = self.system.accounts["cust_0-spx_A"]
+        account.shareclass = self.system.shareclasses["spx_B"]
+        expected = account.calculate_values(self.system.returns_for_fund("spx"))
+        np.testing.assert_allclose(
+            what_if.loc[("cust_0", "spx", "A", 0.002), "expense"],
+            expected.expense.sum(),
+            rtol=1e-12,
+        )
+
+    def test_what_if_candidates(self):
+        """per-fund candidates of different lengths, in bounded batches"""
+        candidates = {"spx": [0.0, 0.01, 0.02], "tech": [0.005]}
+        expected = self.system.what_if(candidates)
+        self.assertEqual(len(expected.loc[(slice(None), "spx"), :]), 3 * 2 * 3)
+        self.assertEqual(len(expected.loc[(slice(None), "tech"), :]), 3 * 2 * 1)
+        with mock.patch("src.accounting_system.WHAT_IF_CHUNK_ELEMENTS", 1):
+            pd.testing.assert_frame_equal(self.system.what_if(candidates), expected)
+
+        spx = self.system.what_if({"spx": [0.0]})
+        self.assertEqual(list(spx.index.unique("fund")), ["spx"])
+        # no expense ratio, no expenses
+        np.testing.assert_array_equal(spx.expense, 0.0)
+        pd.testing.assert_series_equal(
+            self.system.what_if([0.0]).loc[(slice(None), "spx"), :].expense,
+            spx.expense,
+        )
+
+    def test_what_if_without_candidates(self):
+        """no candidates, or none for the accounts' funds, price nothing"""
+        for expense_ratios in [{}, {"notafund": [0.01]}, {"spx": []}]:
+            what_if = self.system.what_if(expense_ratios)
+            self.assertTrue(what_if.empty)
+            self.assertEqual(
+                list(what_if.index.names),
+                ["customer", "fund", "shareclass", "expense_ratio"],
+            )
+            self.assertEqual(list(what_if.columns), ["expense", "impact"])
+
+    def test_impact_scenarios(self):
+        """scenario impact is reproducible and independent of workers"""
+        summary = self.system.calc_impact_scenarios(10, seed=5, batch_size=4)
+        self.assertEqual(
+            list(summary.columns), ["mean", "std", "q0.05", "q0.5", "q0.95"]
+        )
+        # 3 customers x 2 funds, each with one shareclass after the first
+        self.assertEqual(len(summary), 3 * 2)
+        self.assertTrue((summary["q0.05"] <= summary["q0.95"]).all())
+        pd.testing.assert_frame_equal(
+            self.system.calc_impact_scenarios(10, seed=5, batch_size=4, workers=2),
+            summary,
+        )
+        self.assertFalse(
+            self.system.calc_impact_scenarios(10, seed=6, batch_size=4).equals(summary)
+        )
+
+    def test_constant_scenarios(self):
+        """scenarios without return volatility all reproduce calc_impact"""
+        for fund in self.system.funds.values():
+            fund.return_params = [1.001, 0.0]
+        self.system.fund_returns = self.system.fund_returns.assign(returns=1.001)
+        expected = self.system.calc_impact(self.system.calc_accounts()).dropna()
+        summary = self.system.calc_impact_scenarios(5, seed=1)
+        np.testing.assert_allclose(summary["mean"], expected, rtol=1e-12)
+        np.testing.assert_allclose(summary["q0.5"], expected, rtol=1e-12)
+        np.testing.assert_allclose(summary["std"], 0.0, atol=1e-6)
+
+    def test_missing_returns(self):
+        """days without a fund return raise rather than producing NaN values"""
+        fund_returns = self.system.fund_returns
+        dropped = np.zeros(len(fund_returns), dtype=bool)
+        dropped[np.flatnonzero((fund_returns.fund == "spx").to_numpy())[3]] = True
+        self.system.fund_returns = fund_returns[~dropped]
+        for batched in [True, False]:
+            with self.assertRaisesRegex(ValueError, "missing 1 "):
+                self.system.calc_accounts(batched=batched)
+
+
+class TestFromSimulatedData(unittest.TestCase):
+    """tests for loading simulated parquet data"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.data_path = pathlib.Path(self.tmpdir.name)
+        Simulator(
+            start_date=datetime.date(2021, 1, 1),
+            end_date=datetime.date(2021, 3, 31),
+            num_shareclasses=2,
+            num_funds=3,
+            num_customers=4,
+            seed=20210101,
+        ).simulate(self.data_path, return_params=[1.0, 0.005])
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_load(self):
+        """tables are joined up front, objects are only built on lookup"""
+        system = AccountingSystem.from_simulated_data(self.data_path)
+        self.assertEqual(len(system.accounts), 4 * 3 * 2)
+        self.assertEqual(len(system.shareclasses), 3 * 2)
+        self.assertEqual(system.accounts._built, {})
+
+        name = next(iter(system.accounts))
+        account = system.accounts[name]
+        self.assertEqual(account.name, name)
+        self.assertIs(account.shareclass, system.shareclasses[str(account.shareclass)])
+        self.assertEqual(
+            account.shareclass.expense_ratio,
+            system.account_table.loc[name, "expense_ratio"],
+        )
+        self.assertEqual(len(system.accounts._built), 1)
+        # cashflows are views over the registry, on its shared calendar
+        self.assertIs(account.cashflows.cashflow.index, system.registry.dates)
+
+    def test_calc_accounts(self):
+        """batched results on loaded data match the per-account path"""
+        system = AccountingSystem.from_simulated_data(self.data_path)
+        actual = system.calc_accounts(batched=True)
+        self.assertEqual(system.accounts._built, {})
+        expected = system.calc_accounts(batched=False)
+        np.testing.assert_array_equal(
+            actual.NAV.to_numpy(), expected.NAV.to_numpy().astype(float)
+        )
+
+    def test_workers(self):
+        """multi-process results are byte-identical to a single process"""
+        system = AccountingSystem.from_simulated_data(self.data_path)
+        single = system.calc_accounts(workers=1)
+        multi = system.calc_accounts(workers=2)
+        self.assertEqual(single.to_csv(), multi.to_csv())
+        self.assertEqual(
+            system.calc_impact(single).to_csv(), system.calc_impact(multi).to_csv()
+        )
+
+    def test_filters(self):
+        """filtered loads read only matching rows and match slicing a full run"""
+        full = AccountingSystem.from_simulated_data(self.data_path)
+        account_values = full.calc_accounts()
+        customers = list(full.customers)[:2]
+        funds = list(full.funds)[:2]
+        start_date, end_date = "2021-02-01", "2021-03-15"
+
+        system = AccountingSystem.from_simulated_data(
+            self.data_path,
+            customers=customers,
+            funds=funds,
+            start_date=start_date,
+            end_date=end_date,
+        )
+        self.assertEqual(len(system.accounts), 2 * 2 * 2)
+        self.assertLessEqual(system.dates.max(), pd.Timestamp(end_date))
+        self.assertEqual(list(system.registry.accounts), list(system.accounts))
+
+        dates = account_values.index
+        expected = account_values[
+            account_values.customer.isin(customers)
+            & account_values.fund.isin(funds)
+            & (dates >= start_date)
+            & (dates <= end_date)
+        ]
+        actual = system.calc_accounts()
+        self.assertEqual(actual.to_csv(), expected.to_csv())
+        self.assertEqual(
+            system.calc_impact(actual).to_csv(), full.calc_impact(expected).to_csv()
+        )
+
+        by_shareclass = AccountingSystem.from_simulated_data(
+            self.data_path, shareclasses=["A"]
+        )
+        self.assertEqual(set(by_shareclass.account_table.shareclass), {"A"})
+        self.assertEqual(len(by_shareclass.accounts), 4 * 3)
+
+    def test_filters_without_matches(self):
+        """filters matching no accounts raise a clear error"""
+        for filters in [dict(customers=["Nobody"]), dict(funds=["notafund"])]:
+            with self.assertRaisesRegex(NoMatchingAccountsError, "no accounts"):
+                AccountingSystem.from_simulated_data(self.data_path, **filters)
+        self.assertTrue(read_cashflows(self.data_path, accounts=[]).empty)
+
+        # the CLI reports them as a usage error, but not faults in the data
+        command = ["calculate-impact", "--data_path", str(self.data_path)]
+        command += ["--no-cache", "--customer"]
+        result = CliRunner().invoke(cli, command + ["Nobody"])
+        self.assertEqual(result.exit_code, 2)
+        self.assertIn("no accounts", result.output)
+        customer = pd.read_parquet(self.data_path / "accounts.parquet").customer[0]
+        with mock.patch.object(
+            AccountingSystem, "from_tables", side_effect=ValueError("bad book")
+        ):
+            result = CliRunner().invoke(cli, command + [customer])
+        self.assertIsInstance(result.exception, ValueError)
+
+    def test_stream_impact(self):
+        """chunked impact and values match a full in-memory run"""
+        system = AccountingSystem.from_simulated_data(self.data_path)
+        account_values = system.calc_accounts()
+        expected = system.calc_impact(account_values)
+        with tempfile.TemporaryDirectory() as values_path:
+            actual = AccountingSystem.stream_impact(
+                self.data_path, chunk_size=5, values_path=values_path
+            )
+            streamed = pd.read_parquet(values_path)
+        self.assertEqual(actual.to_csv(), expected.to_csv())
+        self.assertEqual(len(streamed), len(account_values))
+        self.assertAlmostEqual(streamed.NAV.sum(), account_values.NAV.sum())
+
+    def test_wide_cashflows(self):
+        """books with dense (date x account) cashflows load the same as long ones"""
+        expected = AccountingSystem.from_simulated_data(self.data_path)
+        name = next(iter(expected.accounts))
+        dense = expected.cashflows[name].cashflow
+        self.assertEqual(len(dense), len(expected.dates))
+        registry = expected.registry
+        rows = registry.cashflow_rows(registry.accounts.get_loc(name))
+        self.assertEqual((dense != 0).sum(), len(registry.cashflow_amounts[rows]))
+
+        long = pd.read_parquet(self.data_path / "cashflows.parquet")
+        wide = (
+            long.pivot(index="date", columns="account", values="amount")
+            .reindex(index=expected.dates, columns=long.account.cat.categories)
+            .fillna(0.0)
+        )
+        wide.columns = list(wide.columns)
+        wide.to_parquet(self.data_path / "cashflows.parquet")
+        actual = AccountingSystem.from_simulated_data(self.data_path)
+        pd.testing.assert_series_equal(actual.cashflows[name].cashflow, dense)
+        self.assertEqual(
+            actual.calc_accounts().to_csv(), expected.calc_accounts().to_csv()
+        )
+
+    def test_incremental(self):
+        """a checkpointed run continued on new dates matches a full run"""
+        full = AccountingSystem.from_simulated_data(self.data_path)
+        expected = full.calc_accounts()
+        cutoff = full.dates[40]
+
+        truncated = AccountingSystem.from_simulated_data(
+            self.data_path, end_date=cutoff
+        )
+        first, checkpoint = truncated.calc_accounts_incremental()
+        self.assertEqual(first.index.max(), cutoff)
+        self.assertTrue((checkpoint.date == cutoff).all())
+
+        # loading only the dates after the checkpoint gives the same result
+        continued = AccountingSystem.from_simulated_data(self.data_path, after=cutoff)
+        self.assertGreater(continued.dates.min(), cutoff)
+        pushed_down, _ = continued.calc_accounts_incremental(checkpoint)
+        # accounts new since the checkpoint are read over their whole history
+        new_account = checkpoint.index[0]
+        with_new, _ = continued.calc_accounts_incremental(checkpoint.iloc[1:])
+        new_values = with_new[with_new.account == new_account]
+        self.assertEqual(
+            new_values.to_csv(), expected[expected.account == new_account].to_csv()
+        )
+
+        second, checkpoint = full.calc_accounts_incremental(checkpoint)
+        self.assertEqual(pushed_down.to_csv(), second.to_csv())
+        self.assertGreater(second.index.min(), cutoff)
+        self.assertEqual(len(first) + len(second), len(expected))
+        combined = pd.concat([first, second])
+        keys = [lambda frame: frame.account.astype(object), lambda frame: frame.index]
+        pd.testing.assert_series_equal(
+            combined.set_index([key(combined) for key in keys]).NAV.sort_index(),
+            expected.set_index([key(expected) for key in keys]).NAV.sort_index(),
+        )
+        # impact is a small difference of large totals summed in another order
+        total_expenses = full.total_expenses(expected)
+        np.testing.assert_allclose(
+            full.impact_from_checkpoint(checkpoint).to_numpy(),
+            full.calc_impact(expected).to_numpy(),
+            rtol=0,
+            atol=1e-12 * total_expenses.abs().max() * len(expected),
+        )
+
+        # nothing new to calculate
+        third, unchanged = full.calc_accounts_incremental(checkpoint)
+        self.assertTrue(third.empty)
+        pd.testing.assert_frame_equal(unchanged, checkpoint)
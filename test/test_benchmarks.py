@@ -0,0 +1,52 @@
+"""
+Smoke test for the pipeline benchmarks
+"""
+import json
+import pathlib
+import tempfile
+import unittest
+from unittest import mock
+
+from click.testing import CliRunner
+
+from benchmarks import pipeline
+
+
+class TestPipelineBenchmarks(unittest.TestCase):
+    """tests for benchmarks.pipeline"""
+
+    def test_run_and_compare(self):
+        """every stage is recorded, and a second run is compared to the first"""
+        tiny = dict(num_funds=1, num_shareclasses=2, num_customers=3, years=1)
+        with tempfile.TemporaryDirectory() as tmp_dir, mock.patch.dict(
+            pipeline.SIZES, {"small": tiny}
+        ):
+            results_path = str(pathlib.Path(tmp_dir) / "results.jsonl")
+            runner = CliRunner()
+            for _ in range(2):
+                result = runner.invoke(
+                    pipeline.cli,
+                    ["run", "--size", "small", "--results_path", results_path],
+                )
+                self.assertEqual(result.exit_code, 0, result.output)
+            records = pipeline.read_results(results_path)
+            self.assertEqual(
+                [record["stage"] for record in records[:6]],
+                [
+                    "simulate",
+                    "load",
+                    "calc_accounts",
+                    "calc_impact",
+                    "write_csv",
+                    "write_parquet",
+                ],
+            )
+            self.assertEqual(len(records), 12)
+            self.assertTrue(all(record["peak_bytes"] > 0 for record in records))
+            json.dumps(records)
+
+            result = runner.invoke(
+                pipeline.cli, ["compare", "--results_path", results_path]
+            )
+            self.assertEqual(result.exit_code, 0, result.output)
+            self.assertEqual(len(result.output.splitlines()), 6)
@@ -0,0 +1,65 @@
+"""
+Tests for the shared business-day calendar
+"""
+import datetime
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from src.business_calendar import BusinessCalendar
+
+
+class TestBusinessCalendar(unittest.TestCase):
+    """tests for BusinessCalendar"""
+
+    def setUp(self):
+        self.calendar = BusinessCalendar.from_range(
+            datetime.date(2021, 1, 1),
+            datetime.date(2021, 1, 31),
+            holidays="USFederalHolidayCalendar",
+        )
+
+    def test_holidays(self):
+        """weekends and holidays are not business days"""
+        weekdays = pd.bdate_range("2021-01-01", "2021-01-31")
+        self.assertEqual(len(self.calendar), len(weekdays) - 2)
+        self.assertNotIn(pd.Timestamp("2021-01-01"), self.calendar.dates)
+        self.assertNotIn(pd.Timestamp("2021-01-18"), self.calendar.dates)
+        self.assertEqual(
+            BusinessCalendar.from_range(
+                datetime.date(2021, 1, 1),
+                datetime.date(2021, 1, 31),
+                holidays=[datetime.date(2021, 1, 1), datetime.date(2021, 1, 18)],
+            ),
+            self.calendar,
+        )
+
+    def test_offsets(self):
+        """dates map to day numbers; dates off the calendar raise"""
+        np.testing.assert_array_equal(
+            self.calendar.offsets(["2021-01-04", "2021-01-05", "2021-01-19"]),
+            [0, 1, 10],
+        )
+        with self.assertRaisesRegex(KeyError, "1 dates"):
+            self.calendar.offsets(["2021-01-04", "2021-01-18"])
+
+    def test_align(self):
+        """series are aligned by offset, with gaps raising unless filled"""
+        series = pd.Series(
+            [1.0, 2.0, 3.0],
+            index=pd.to_datetime(["2021-01-05", "2021-01-18", "2021-02-01"]),
+            name="cashflow",
+        )
+        aligned = self.calendar.align(series, fill=0.0)
+        self.assertEqual(aligned.sum(), 1.0)
+        self.assertEqual(aligned[1], 1.0)
+        with self.assertRaisesRegex(ValueError, "cashflow is missing 18"):
+            self.calendar.align(series)
+        full = self.calendar.series(np.arange(len(self.calendar)), name="returns")
+        np.testing.assert_array_equal(self.calendar.align(full), full.to_numpy())
+
+    def test_unordered(self):
+        """calendar dates must be unique and increasing"""
+        with self.assertRaises(ValueError):
+            BusinessCalendar(pd.to_datetime(["2021-01-05", "2021-01-04"]))
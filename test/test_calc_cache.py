@@ -0,0 +1,143 @@
+"""
+Tests for the calc cache
+"""
+import datetime
+import os
+import pathlib
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+from click.testing import CliRunner
+
+from main import cli
+from src.calc_cache import CalcCache, default_cache_dir
+from src.simulator import Simulator
+from test.helpers import make_system
+
+
+class TestCalcCache(unittest.TestCase):
+    """tests for CalcCache"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache_dir = pathlib.Path(self.tmpdir.name)
+        self.system = make_system()
+        self.expected = self.system.calc_accounts()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_reuse(self):
+        """cached values are reused and identical to calculated ones"""
+        cache = CalcCache(self.cache_dir)
+        first = self.system.calc_accounts(cache=cache)
+        self.assertEqual(first.to_csv(), self.expected.to_csv())
+        with mock.patch("src.accounting_system.calculate_nav") as calculate_nav:
+            second = self.system.calc_accounts(cache=CalcCache(self.cache_dir))
+        calculate_nav.assert_not_called()
+        self.assertEqual(second.to_csv(), self.expected.to_csv())
+
+    def test_changed_inputs(self):
+        """only accounts whose inputs changed are recalculated"""
+        self.system.calc_accounts(cache=CalcCache(self.cache_dir))
+        name = next(iter(self.system.accounts))
+        cashflow = self.system.accounts[name].cashflows.cashflow
+        cashflow.iloc[10] += 0.25
+        expected = self.system.calc_accounts()
+
+        cache = CalcCache(self.cache_dir)
+        with mock.patch.object(cache, "store", wraps=cache.store) as store:
+            actual = self.system.calc_accounts(cache=cache)
+        (keys, _), _ = store.call_args
+        self.assertEqual(len(keys), 1)
+        self.assertEqual(actual.to_csv(), expected.to_csv())
+
+    def test_engine_version(self):
+        """a new engine version invalidates every entry"""
+        self.system.calc_accounts(cache=CalcCache(self.cache_dir))
+        with mock.patch("src.calc_cache.ENGINE_VERSION", 2):
+            cache = CalcCache(self.cache_dir)
+            keys = cache.fingerprints(
+                self.system.dates,
+                np.ones((3, 2)),
+                np.zeros((3, 2)),
+                1.0,
+                0.01,
+            )
+            found, _ = cache.load(keys, 3)
+        self.assertFalse(found.any())
+
+    def test_eviction(self):
+        """least recently used segments are evicted beyond max_bytes"""
+        accounts = self.system.account_table
+        cache = CalcCache(self.cache_dir, max_bytes=1)
+        with mock.patch("src.calc_cache.np.save") as save:
+            self.system._calc_accounts_batched(accounts=accounts.iloc[:2], cache=cache)
+        # a segment over max_bytes on its own is never written
+        save.assert_not_called()
+        self.assertEqual(list(self.cache_dir.glob("*")), [])
+
+        cache = CalcCache(self.cache_dir, max_bytes=10**9)
+        self.system._calc_accounts_batched(accounts=accounts.iloc[:2], cache=cache)
+        self.system._calc_accounts_batched(accounts=accounts.iloc[2:], cache=cache)
+        segments = sorted(
+            self.cache_dir.glob("segment-*"), key=lambda path: path.stat().st_mtime
+        )
+        self.assertEqual(len(segments), 2)
+        cache.max_bytes = cache._segment_bytes(segments[-1])
+        cache.evict()
+        self.assertEqual(list(self.cache_dir.glob("*")), segments[-1:])
+        found, _ = CalcCache(self.cache_dir).load(
+            cache.fingerprints(
+                self.system.dates,
+                *self._inputs(accounts.iloc[2:]),
+            ),
+            len(self.system.dates),
+        )
+        self.assertTrue(found.all())
+
+    def _inputs(self, accounts):
+        """gross returns, cashflows, initial NAV and expense ratio of accounts"""
+        dates = self.system.dates
+        gross = self.system._fund_return_matrix.reindex(dates)[accounts.fund].to_numpy(
+            dtype=float
+        )
+        cash = self.system._cashflow_matrix(list(accounts.index), dates)
+        return (
+            gross,
+            cash,
+            accounts.initial_investment.to_numpy(dtype=float),
+            accounts.expense_ratio.to_numpy(dtype=float),
+        )
+
+    def test_cli(self):
+        """calculate-impact caches by default, outside the book, unless told not to"""
+        data_path = self.cache_dir / "book"
+        Simulator(
+            start_date=datetime.date(2021, 1, 1),
+            end_date=datetime.date(2021, 3, 31),
+            num_funds=1,
+            num_shareclasses=2,
+            num_customers=2,
+            seed=5,
+        ).simulate(data_path, return_params=[1.0, 0.01])
+        command = ["calculate-impact", "--data_path", str(data_path)]
+        cache_home = self.cache_dir / "home"
+        with mock.patch.dict(os.environ, {"XDG_CACHE_HOME": str(cache_home)}):
+            default = default_cache_dir()
+            runner = CliRunner()
+            result = runner.invoke(cli, command + ["--no-cache"])
+            self.assertEqual(result.exit_code, 0, result.output)
+            self.assertFalse(default.exists())
+
+            result = runner.invoke(cli, command)
+            self.assertEqual(result.exit_code, 0, result.output)
+        self.assertTrue(default.is_relative_to(cache_home))
+        self.assertEqual(len(CalcCache(default).index), 2 * 2)
+
+        override = self.cache_dir / "elsewhere"
+        result = runner.invoke(cli, command + ["--cache_dir", str(override)])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertEqual(len(CalcCache(override).index), 2 * 2)
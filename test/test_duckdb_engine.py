@@ -0,0 +1,86 @@
+"""
+Tests for the DuckDB engine
+"""
+import datetime
+import pathlib
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from src.accounting_system import AccountingSystem
+from src.simulator import Simulator
+
+try:
+    from src.duckdb_engine import calc_accounts_duckdb
+except ImportError:  # duckdb is optional for the pandas engine
+    calc_accounts_duckdb = None
+
+
+@unittest.skipIf(calc_accounts_duckdb is None, "duckdb is not installed")
+class TestDuckDBEngine(unittest.TestCase):
+    """tests for calc_accounts_duckdb"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.data_path = pathlib.Path(self.tmpdir.name)
+        Simulator(
+            start_date=datetime.date(2021, 1, 1),
+            end_date=datetime.date(2021, 6, 30),
+            num_shareclasses=3,
+            num_funds=2,
+            num_customers=4,
+            seed=11,
+            customers_per_shard=3,
+        ).simulate(self.data_path, return_params=[1.0, 0.01])
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_matches_pandas(self):
+        """SQL values and impact match the pandas engine"""
+        system = AccountingSystem.from_simulated_data(self.data_path)
+        expected = system.calc_accounts()
+        expected_impact = system.calc_impact(expected)
+
+        actual, impact = calc_accounts_duckdb(self.data_path, threads=2)
+        self.assertEqual(list(actual.columns), list(expected.columns))
+        self.assertEqual(actual.index.name, expected.index.name)
+        np.testing.assert_array_equal(actual.index, expected.index)
+        for col in ["account", "customer", "fund", "shareclass"]:
+            np.testing.assert_array_equal(
+                actual[col].astype(str), expected[col].astype(str)
+            )
+        for col in ["gross_return", "cashflow", "init_GAV", "GAV", "expense", "NAV"]:
+            np.testing.assert_allclose(
+                actual[col], expected[col], rtol=1e-9, atol=1e-9, err_msg=col
+            )
+        self.assertEqual(list(impact.index), list(expected_impact.index))
+        np.testing.assert_allclose(impact, expected_impact, rtol=1e-9)
+
+    def test_missing_returns(self):
+        """funds lacking returns raise like the pandas engine"""
+        path = self.data_path / "fund_returns.parquet"
+        fund_returns = pd.read_parquet(path)
+        fund = fund_returns.fund.iloc[0]
+        gap = fund_returns[
+            (fund_returns.fund != fund) | (fund_returns.index != fund_returns.index[5])
+        ]
+        gap.to_parquet(path)
+        with self.assertRaisesRegex(ValueError, f"{fund} returns are missing 1 of"):
+            calc_accounts_duckdb(self.data_path)
+
+        fund_returns[fund_returns.fund != fund].to_parquet(path)
+        with self.assertRaisesRegex(
+            ValueError, f"{fund} does not appear in loaded fund_returns"
+        ):
+            calc_accounts_duckdb(self.data_path)
+
+    def test_missing_shareclass(self):
+        """accounts of unknown shareclasses raise rather than being dropped"""
+        path = self.data_path / "shareclasses.parquet"
+        shareclasses = pd.read_parquet(path)
+        shareclasses.iloc[1:].to_parquet(path)
+        with self.assertRaisesRegex(KeyError, "accounts reference unknown"):
+            calc_accounts_duckdb(self.data_path)
@@ -0,0 +1,49 @@
+"""
+Tests for CLI startup
+"""
+import pathlib
+import subprocess
+import sys
+import unittest
+
+ROOT = pathlib.Path(__file__).parent.parent
+
+HEAVY_MODULES = ["pandas", "numpy", "pyarrow", "duckdb"]
+
+
+class TestStartup(unittest.TestCase):
+    """main.py --help should not import the calculation stack"""
+
+    def run_python(self, *args) -> subprocess.CompletedProcess:
+        return subprocess.run(
+            [sys.executable, *args],
+            capture_output=True,
+            check=True,
+            text=True,
+            cwd=ROOT,
+        )
+
+    def test_help_skips_heavy_imports(self):
+        """--help imports none of the heavy modules"""
+        result = self.run_python(
+            "-c",
+            "import sys, main\n"
+            "try:\n"
+            "    main.cli(['--help'])\n"
+            "except SystemExit:\n"
+            "    pass\n"
+            f"print(sorted(set({HEAVY_MODULES!r}) & set(sys.modules)))",
+        )
+        self.assertEqual(result.stdout.splitlines()[-1], "[]")
+
+    def test_lazy_attributes(self):
+        """src exposes Simulator and AccountingSystem on first access"""
+        result = self.run_python(
+            "-c",
+            "import sys, src\n"
+            "print('pandas' in sys.modules)\n"
+            "print(src.AccountingSystem.__name__, src.Simulator.__name__)",
+        )
+        self.assertEqual(
+            result.stdout.splitlines(), ["False", "AccountingSystem Simulator"]
+        )
@@ -0,0 +1,58 @@
+"""
+Tests for stage profiling and log rate limiting
+"""
+import json
+import logging
+import pathlib
+import tempfile
+import unittest
+from unittest import mock
+
+from src.metrics import Profiler, RateLimitFilter
+
+
+class TestProfiler(unittest.TestCase):
+    """tests for Profiler"""
+
+    def test_report(self):
+        """stages are recorded with counts and throughput, and written as JSON"""
+        profiler = Profiler()
+        with profiler.stage("load", accounts=10):
+            pass
+        with profiler.stage("calc") as stage:
+            stage.rows = 100
+        report = profiler.report()
+        self.assertEqual([s["stage"] for s in report["stages"]], ["load", "calc"])
+        self.assertEqual(report["stages"][1]["rows"], 100)
+        self.assertIsNone(report["stages"][1]["accounts_per_sec"])
+        self.assertGreater(report["stages"][0]["accounts_per_sec"], 0)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = pathlib.Path(tmp_dir) / "profile.json"
+            profiler.write(path)
+            self.assertEqual(json.loads(path.read_text())["stages"], report["stages"])
+
+    def test_disabled(self):
+        """a disabled profiler keeps no stages"""
+        profiler = Profiler(enabled=False)
+        with profiler.stage("load"):
+            pass
+        self.assertEqual(profiler.report()["stages"], [])
+
+
+class TestRateLimitFilter(unittest.TestCase):
+    """tests for RateLimitFilter"""
+
+    def test_rate_limit(self):
+        """one record per call site per interval, noting those suppressed"""
+        log_filter = RateLimitFilter(interval=1.0)
+
+        def record():
+            return logging.LogRecord("x", logging.INFO, "x.py", 1, "msg", (), None)
+
+        records = [record() for _ in range(4)]
+        with mock.patch("src.metrics.time.monotonic", side_effect=[0, 0.5, 0.6, 1.5]):
+            passed = [log_filter.filter(rec) for rec in records]
+        self.assertEqual(passed, [True, False, False, True])
+        self.assertEqual(records[0].getMessage(), "msg")
+        self.assertEqual(records[3].getMessage(), "msg (2 similar messages suppressed)")
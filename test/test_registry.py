@@ -0,0 +1,73 @@
+"""
+Tests for the struct-of-arrays book registry
+"""
+import datetime
+import pathlib
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from src.accounting_system import LOAD_COLUMNS
+from src.registry import BookRegistry
+from src.simulator import Simulator
+from src.storage import read_cashflows, read_table
+
+
+class TestBookRegistry(unittest.TestCase):
+    """tests for BookRegistry"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        data_path = pathlib.Path(self.tmpdir.name)
+        Simulator(
+            start_date=datetime.date(2021, 1, 1),
+            end_date=datetime.date(2021, 3, 31),
+            num_shareclasses=2,
+            num_funds=2,
+            num_customers=5,
+            seed=7,
+        ).simulate(data_path, return_params=[1.0, 0.005])
+        self.tables = {
+            name: read_table(data_path, name, columns=columns)
+            for name, columns in LOAD_COLUMNS.items()
+        }
+        self.tables["cashflows"] = read_cashflows(data_path)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_ids(self):
+        """accounts reference customers and shareclasses by integer id"""
+        registry = BookRegistry.from_tables(self.tables)
+        accounts = registry.account_table()
+        self.assertEqual(len(accounts), 5 * 2 * 2)
+        self.assertEqual(registry.account_customer.dtype, np.int32)
+        np.testing.assert_array_equal(
+            accounts.customer, self.tables["accounts"].customer
+        )
+        np.testing.assert_array_equal(
+            accounts.shareclass, self.tables["accounts"].shareclass
+        )
+
+    def test_cashflow_rows(self):
+        """each account's cashflow rows match its rows of the long table"""
+        cashflows = self.tables["cashflows"].sample(frac=1, random_state=0)
+        registry = BookRegistry.from_tables({**self.tables, "cashflows": cashflows})
+        self.assertEqual(registry.cashflow_offsets[-1], len(cashflows))
+        for account_id, name in enumerate(registry.accounts):
+            rows = registry.cashflow_rows(account_id)
+            expected = cashflows[cashflows.account == name].sort_values("date")
+            actual = pd.Series(
+                registry.cashflow_amounts[rows],
+                index=registry.dates[registry.cashflow_days[rows]],
+            ).sort_index()
+            np.testing.assert_array_equal(actual.index, expected.date)
+            np.testing.assert_array_equal(actual, expected.amount)
+
+    def test_unknown_customer(self):
+        """accounts of customers that are not in the book raise"""
+        customers = self.tables["customers"].iloc[1:]
+        with self.assertRaises(KeyError):
+            BookRegistry.from_tables({**self.tables, "customers": customers})
@@ -0,0 +1,125 @@
+"""
+Tests for the warm book server
+"""
+import datetime
+import json
+import os
+import pathlib
+import tempfile
+import threading
+import unittest
+import urllib.error
+import urllib.request
+from unittest import mock
+
+from src.accounting_system import AccountingSystem
+from src.server import BookServer, WarmBook
+from src.simulator import Simulator
+
+
+class TestWarmBook(unittest.TestCase):
+    """tests for WarmBook and BookServer"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.data_path = pathlib.Path(cls.tmpdir.name)
+        Simulator(
+            start_date=datetime.date(2021, 1, 1),
+            end_date=datetime.date(2021, 6, 30),
+            num_funds=2,
+            num_shareclasses=2,
+            num_customers=4,
+            seed=3,
+        ).simulate(cls.data_path, return_params=[1.0, 0.005])
+        system = AccountingSystem.from_simulated_data(cls.data_path)
+        cls.account_values = system.calc_accounts()
+        cls.impact = system.calc_impact(cls.account_values)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    def setUp(self):
+        self.book = WarmBook(self.data_path)
+
+    def test_queries(self):
+        """queries match a cold calculation of the same selection"""
+        customer = self.impact.index.get_level_values("customer")[0]
+        fund = self.impact.index.get_level_values("fund")[0]
+        expected = self.impact.xs(customer, level="customer", drop_level=False)
+        self.assertTrue(self.book.query_impact(customers=[customer]).equals(expected))
+        self.assertTrue(self.book.query_impact().equals(self.impact))
+
+        values = self.book.query_account_values(
+            customers=[customer], funds=[fund], start="2021-03-01", end="2021-03-31"
+        )
+        dates = self.account_values.index
+        expected = self.account_values[
+            (self.account_values.customer == customer)
+            & (self.account_values.fund == fund)
+            & (dates >= "2021-03-01")
+            & (dates <= "2021-03-31")
+        ]
+        self.assertGreater(len(values), 0)
+        self.assertTrue(values.equals(expected))
+
+    def test_refresh(self):
+        """only tables whose files changed are re-read"""
+        self.assertEqual(self.book.refresh(), [])
+        path = self.data_path / "shareclasses.parquet"
+        stat = path.stat()
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        snapshot = self.book.snapshot
+        self.assertEqual(self.book.refresh(), ["shareclasses"])
+        self.assertIsNot(self.book.snapshot, snapshot)
+        self.assertIs(self.book.system, self.book.snapshot.system)
+
+        # a failed reload keeps the last snapshot and is retried next time
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 2 * 10**9))
+        snapshot = self.book.snapshot
+        with mock.patch(
+            "src.server.AccountingSystem.from_tables", side_effect=ValueError
+        ):
+            with self.assertRaises(ValueError):
+                self.book.refresh()
+        self.assertIs(self.book.snapshot, snapshot)
+        self.assertEqual(self.book.refresh(), ["shareclasses"])
+
+    def test_http(self):
+        """the server answers queries and rejects bad ones"""
+        server = BookServer(("127.0.0.1", 0), self.book)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        base = "http://%s:%s" % server.server_address
+        try:
+            customer = self.impact.index.get_level_values("customer")[0]
+            with urllib.request.urlopen(f"{base}/impact?customer={customer}") as resp:
+                records = json.load(resp)
+            self.assertEqual(
+                len(records),
+                len(self.impact.xs(customer, level="customer")),
+            )
+            self.assertEqual(
+                set(records[0]), {"customer", "fund", "shareclass", "impact"}
+            )
+            with self.assertRaises(urllib.error.HTTPError) as raised:
+                urllib.request.urlopen(f"{base}/account_values?start=notadate")
+            self.assertEqual(raised.exception.code, 400)
+            # failing to reload the book is a server error, even a ValueError
+            with mock.patch.object(
+                self.book, "refresh", side_effect=ValueError("returns are missing")
+            ), self.assertLogs("src.server", "ERROR"):
+                with self.assertRaises(urllib.error.HTTPError) as raised:
+                    urllib.request.urlopen(f"{base}/impact")
+            self.assertEqual(raised.exception.code, 500)
+            self.assertIn("returns are missing", json.load(raised.exception)["error"])
+            with mock.patch.object(
+                self.book, "query_impact", side_effect=OSError("book unreadable")
+            ), self.assertLogs("src.server", "ERROR"):
+                with self.assertRaises(urllib.error.HTTPError) as raised:
+                    urllib.request.urlopen(f"{base}/impact")
+            self.assertEqual(raised.exception.code, 500)
+        finally:
+            server.shutdown()
+            server.server_close()
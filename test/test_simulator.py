@@ -5,8 +5,15 @@ import datetime
 import pathlib
 import tempfile
 import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
 
+import numpy as np
+import pandas as pd
+
+from src.accounting_system import AccountingSystem
 from src.simulator import Simulator
+from src.storage import IO_THREADS, read_table, write_tables
 
 
 class TestSimulator(unittest.TestCase):
@@ -40,3 +47,103 @@ class TestSimulator(unittest.TestCase):
             sim.simulate(pathlib.Path(outpath), return_params=[0.01, 0.005])
             files = [path.name for path in pathlib.Path(outpath).glob("*.parquet")]
             self.assertEqual(sorted(files), sorted(self.expected_files))
+
+    def test_seed(self):
+        """the same seed reproduces the same tables, a different seed does not"""
+        frames = []
+        for seed in [7, 7, 8]:
+            sim = Simulator(**self.simulator_params, seed=seed)
+            with tempfile.TemporaryDirectory() as outpath:
+                sim.simulate(pathlib.Path(outpath), return_params=[0.01, 0.005])
+                frames.append(
+                    {
+                        name: pd.read_parquet(pathlib.Path(outpath) / name)
+                        for name in self.expected_files
+                    }
+                )
+        for name in self.expected_files:
+            pd.testing.assert_frame_equal(frames[0][name], frames[1][name])
+        self.assertFalse(
+            frames[0]["cashflows.parquet"].equals(frames[2]["cashflows.parquet"])
+        )
+
+    def test_holidays(self):
+        """returns and cashflows fall on the same calendar, without holidays"""
+        sim = Simulator(
+            **self.simulator_params, seed=3, holidays="USFederalHolidayCalendar"
+        )
+        with tempfile.TemporaryDirectory() as outpath:
+            sim.simulate(pathlib.Path(outpath), return_params=[1.0, 0.005])
+            fund_returns = read_table(outpath, "fund_returns")
+            cashflows = read_table(outpath, "cashflows")
+            system = AccountingSystem.from_simulated_data(outpath)
+        dates = sim.calendar.dates
+        self.assertNotIn(pd.Timestamp("2021-07-05"), dates)
+        self.assertTrue(fund_returns.index.isin(dates).all())
+        self.assertTrue(cashflows.date.isin(dates).all())
+        self.assertTrue(system.dates.equals(dates))
+        self.assertFalse(system.calc_accounts().NAV.isna().any())
+
+    def test_cashflow_turnover(self):
+        """simulated cashflows sum to 1 / turnover in absolute value"""
+        sim = Simulator(**self.simulator_params, seed=1)
+        with tempfile.TemporaryDirectory() as outpath:
+            sim.simulate(pathlib.Path(outpath), return_params=[0.01, 0.005])
+            cashflows = pd.read_parquet(pathlib.Path(outpath) / "cashflows.parquet")
+            customers = pd.read_parquet(pathlib.Path(outpath) / "customers.parquet")
+        self.assertEqual(list(cashflows.columns), ["account", "date", "amount"])
+        self.assertEqual(len(cashflows.account.cat.categories), 25 * 3 * 2)
+        self.assertFalse((cashflows.amount == 0).any())
+        absolute = cashflows.groupby("account", observed=True).amount.apply(
+            lambda amount: amount.abs().sum()
+        )
+        turnover = customers.set_index("name").turnover
+        account_turnover = turnover[absolute.index.str.split("-").str[0]]
+        np.testing.assert_allclose(absolute.to_numpy(), 1 / account_turnover)
+
+    def test_shards(self):
+        """sharded output is the same whatever the number of workers"""
+        sim = Simulator(**self.simulator_params, seed=3, customers_per_shard=10)
+        self.assertEqual(sim.num_shards, 3)
+        tables = []
+        with tempfile.TemporaryDirectory() as outpath:
+            for workers in [1, 2]:
+                out_path = pathlib.Path(outpath) / str(workers)
+                sim.simulate(out_path, workers=workers, return_params=[0.01, 0.005])
+                tables.append(
+                    {
+                        name: read_table(out_path, name)
+                        for name in ["customers", "accounts", "cashflows"]
+                    }
+                )
+            parts = sorted(path.name for path in (out_path / "cashflows").iterdir())
+            self.assertEqual(parts, [f"part-000{i}.parquet" for i in range(3)])
+            system = AccountingSystem.from_simulated_data(out_path)
+        for name, frame in tables[0].items():
+            pd.testing.assert_frame_equal(frame, tables[1][name])
+        self.assertEqual(len(tables[0]["customers"]), 25)
+        self.assertEqual(tables[0]["customers"].name.nunique(), 25)
+        self.assertEqual(len(system.accounts), 25 * 3 * 2)
+
+    def test_shard_writer_threads(self):
+        """shard workers write with one thread each, a single process with more"""
+        sim = Simulator(**self.simulator_params, seed=3, customers_per_shard=10)
+        with tempfile.TemporaryDirectory() as outpath:
+            for workers, threads in [(1, IO_THREADS), (2, 1)]:
+                # threads stand in for worker processes, so the mock sees calls
+                with mock.patch(
+                    "src.simulator.ProcessPoolExecutor", ThreadPoolExecutor
+                ), mock.patch(
+                    "src.simulator.write_tables", wraps=write_tables
+                ) as written:
+                    sim.simulate(
+                        pathlib.Path(outpath) / str(workers),
+                        workers=workers,
+                        return_params=[0.01, 0.005],
+                    )
+                shard_calls = [
+                    call for call in written.call_args_list if "part" in call.kwargs
+                ]
+                self.assertEqual(len(shard_calls), sim.num_shards)
+                for call in shard_calls:
+                    self.assertEqual(call.kwargs["threads"], threads)
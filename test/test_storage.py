@@ -0,0 +1,138 @@
+"""
+Tests for reading and writing tables and outputs
+"""
+import pathlib
+import tempfile
+import unittest
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+
+from src.storage import (
+    read_table,
+    read_tables,
+    write_account_values,
+    write_impact,
+    write_tables,
+)
+from test.helpers import make_system
+
+
+class TestOutputs(unittest.TestCase):
+    """tests for write_account_values and write_impact"""
+
+    def setUp(self):
+        system = make_system()
+        self.account_values = system.calc_accounts()
+        self.impact = system.calc_impact(self.account_values)
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.out_path = pathlib.Path(self.tmpdir.name)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def read_values(self, output_format: str) -> pd.DataFrame:
+        """account values dataset as a frame sorted like the written one"""
+        table = ds.dataset(
+            self.out_path / "account_values",
+            format="ipc" if output_format == "arrow" else output_format,
+            partitioning="hive",
+        ).to_table()
+        self.assertTrue(pa.types.is_dictionary(table.schema.field("account").type))
+        return (
+            table.to_pandas()
+            .astype({"account": str})
+            .sort_values(["account", "date"], ignore_index=True)
+        )
+
+    def test_datasets(self):
+        """parquet and arrow datasets hold the account values, partitioned by fund"""
+        expected = (
+            self.account_values.reset_index()
+            .astype({"account": str})
+            .sort_values(["account", "date"], ignore_index=True)
+        )
+        for output_format in ["parquet", "arrow"]:
+            write_account_values(self.account_values, self.out_path, output_format)
+            self.assertEqual(
+                sorted(
+                    path.name for path in (self.out_path / "account_values").iterdir()
+                ),
+                ["fund=spx", "fund=tech"],
+            )
+            actual = self.read_values(output_format)
+            pd.testing.assert_series_equal(actual.NAV, expected.NAV)
+            pd.testing.assert_series_equal(actual.account, expected.account)
+
+    def test_append(self):
+        """appending adds a part and replacing removes earlier parts"""
+        first, second = (
+            self.account_values[self.account_values.index < "2021-04-01"],
+            self.account_values[self.account_values.index >= "2021-04-01"],
+        )
+        write_account_values(first, self.out_path, "parquet")
+        write_account_values(second, self.out_path, "parquet", append=True)
+        self.assertEqual(len(self.read_values("parquet")), len(self.account_values))
+
+        write_account_values(second, self.out_path, "parquet")
+        self.assertEqual(len(self.read_values("parquet")), len(second))
+
+        write_account_values(first, self.out_path, "csv", append=True)
+        write_account_values(second, self.out_path, "csv", append=True)
+        csv = pd.read_csv(self.out_path / "account_values.csv")
+        self.assertEqual(len(csv), len(self.account_values))
+
+    def test_impact(self):
+        """impact is written with its labels as columns"""
+        write_impact(self.impact, self.out_path, "parquet")
+        write_impact(self.impact, self.out_path, "arrow")
+        for table in [
+            pq.read_table(self.out_path / "impact.parquet"),
+            feather.read_table(self.out_path / "impact.arrow"),
+        ]:
+            self.assertEqual(
+                table.column_names, ["customer", "fund", "shareclass", "expense"]
+            )
+            pd.testing.assert_series_equal(
+                table.to_pandas().expense, self.impact.reset_index(drop=True)
+            )
+
+    def test_unknown_format(self):
+        """formats other than csv, parquet and arrow are rejected, keeping output"""
+        write_account_values(self.account_values, self.out_path, "parquet")
+        with self.assertRaises(ValueError):
+            write_account_values(self.account_values, self.out_path, "json")
+        self.assertEqual(len(self.read_values("parquet")), len(self.account_values))
+        with self.assertRaises(ValueError):
+            write_impact(self.impact, self.out_path, "json")
+
+
+class TestTables(unittest.TestCase):
+    """tests for concurrent read_tables and write_tables"""
+
+    def test_round_trip(self):
+        """tables and parts written concurrently read back unchanged"""
+        frames = {
+            "funds": pd.DataFrame({"name": ["spx", "tech"], "start_date": [1, 2]}),
+            "customers": pd.DataFrame(
+                {"name": ["Jim_0", "Bob_1"], "turnover": [1.0, 2.0]}
+            ),
+        }
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            data_path = pathlib.Path(tmp_dir)
+            write_tables(frames, data_path)
+            read = read_tables(data_path, {"funds": None, "customers": ["name"]})
+            pd.testing.assert_frame_equal(read["funds"], frames["funds"])
+            pd.testing.assert_frame_equal(
+                read["customers"], frames["customers"][["name"]]
+            )
+
+            for part in range(3):
+                write_tables({"accounts": frames["customers"]}, data_path, part=part)
+            pd.testing.assert_frame_equal(
+                read_table(data_path, "accounts"),
+                pd.concat([frames["customers"]] * 3, ignore_index=True),
+            )